@@ -77,7 +77,8 @@ def _run_geoip(ip):
         return {
             "city": r.city.name,
             "country": r.country.name,
-            "country_iso": r.country.iso_code,
+            # normalised here so scoring never has to upper-case per IOC
+            "country_iso": r.country.iso_code.upper() if r.country.iso_code else None,
             "location": {"lat": r.location.latitude, "lon": r.location.longitude}
         }
     except Exception:
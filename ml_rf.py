@@ -13,13 +13,14 @@ from __future__ import annotations
 import argparse
 import json
 import math
+import re
 import datetime
+import threading
 from pathlib import Path
 from typing import Tuple, List, Any, Dict
 
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
 import joblib
 
 from sklearn.ensemble import RandomForestClassifier
@@ -36,22 +37,48 @@ from sklearn.metrics import (
 from sklearn.pipeline import Pipeline
 from sklearn.compose import ColumnTransformer
 from sklearn.preprocessing import StandardScaler, OneHotEncoder
-from sklearn.calibration import CalibrationDisplay
+
+# optional: numba fuses the derived numeric features into one compiled loop
+try:
+    from numba import njit, prange
+    _NUMBA_AVAILABLE = True
+except Exception:
+    _NUMBA_AVAILABLE = False
 
 # -------------------------
 # Helpers
 # -------------------------
+# one scan over the PTR instead of lower() + four substring searches
+_PTR_RE = re.compile(r"scan|security|ipip|crawl", re.IGNORECASE)
+
 def safe_get(d: Dict, *keys, default=None):
-    cur = d
-    for k in keys:
-        if not isinstance(cur, dict):
-            return default
-        cur = cur.get(k)
-        if cur is None:
-            return default
-    return cur
+    # missing keys raise KeyError, None/non-mapping steps raise TypeError
+    try:
+        for k in keys:
+            d = d[k]
+    except (KeyError, TypeError, IndexError):
+        return default
+    return default if d is None else d
+
+def _pyplot():
+    # matplotlib is imported only when a plot is actually drawn; Agg skips the GUI backend probe
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    return plt
 
 def make_onehot_encoder(**kwargs):
+    # rare categories (mostly long-tail ISPs) fold into one "infrequent" column
+    # on sklearn >= 1.1, which keeps the encoded width and RF split scans small
+    try:
+        return OneHotEncoder(
+            handle_unknown="infrequent_if_exist",
+            sparse_output=kwargs.get("sparse_output", False),
+            min_frequency=kwargs.get("min_frequency", 10),
+            max_categories=kwargs.get("max_categories", 500),
+        )
+    except TypeError:
+        pass
     try:
         return OneHotEncoder(handle_unknown="ignore", sparse_output=kwargs.get("sparse_output", False))
     except TypeError:
@@ -75,7 +102,7 @@ def build_feature_row(ioc: Dict) -> Dict[str, Any]:
     features["distinct_users"] = int(safe_get(abuse, "numDistinctUsers", default=0) or 0)
     
     ptr = safe_get(enrich, "reverse", "ptr", default="") or ""
-    features["ptr_suspicious"] = 1 if ptr and any(k in ptr.lower() for k in ("scan", "security", "ipip", "crawl")) else 0
+    features["ptr_suspicious"] = 1 if ptr and _PTR_RE.search(ptr) else 0
     features["ptr_present"] = 1 if ptr else 0
     
     isp = safe_get(abuse, "isp", default="") or ""
@@ -102,19 +129,50 @@ def build_feature_row(ioc: Dict) -> Dict[str, Any]:
                 dt = dt.astimezone(datetime.timezone.utc)
             
             features["report_dt_raw"] = dt
-            
-            now_utc = datetime.datetime.now(datetime.timezone.utc)
-            delta_days = (now_utc - dt).total_seconds() / 86400.0
-            features["days_since_last_report"] = max(0.0, float(delta_days))
         except Exception:
-            features["days_since_last_report"] = 0.0
-    else:
-        features["days_since_last_report"] = 0.0
-        
-    features["log_reports"] = math.log10(features["total_reports"] + 1)
-    features["sqrt_distinct_users"] = math.sqrt(features["distinct_users"])
+            pass
+
+    # log_reports, sqrt_distinct_users and days_since_last_report are derived
+    # for the whole frame at once in add_numeric_features()
     return features
 
+def _numeric_features_np(tr, du, ts, has_ts, now_ts):
+    lr = np.log10(tr + 1.0)
+    sd = np.sqrt(du)
+    ds = np.where(has_ts, np.maximum(0.0, (now_ts - ts) / 86400.0), 0.0)
+    return lr, sd, ds
+
+if _NUMBA_AVAILABLE:
+    # missing timestamps are flagged in has_ts rather than NaN, since fastmath assumes no NaNs
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _numeric_features(tr, du, ts, has_ts, now_ts):
+        n = tr.shape[0]
+        lr = np.empty(n)
+        sd = np.empty(n)
+        ds = np.empty(n)
+        for i in prange(n):
+            lr[i] = math.log10(tr[i] + 1.0)
+            sd[i] = math.sqrt(du[i])
+            ds[i] = max(0.0, (now_ts - ts[i]) / 86400.0) if has_ts[i] else 0.0
+        return lr, sd, ds
+else:
+    _numeric_features = _numeric_features_np
+
+def add_numeric_features(df: pd.DataFrame) -> pd.DataFrame:
+    """Fill log_reports, sqrt_distinct_users and days_since_last_report (relative to now)."""
+    epoch = pd.Timestamp(0, tz="UTC")
+    dt = pd.to_datetime(df["report_dt_raw"], utc=True)
+    has_ts = dt.notna().to_numpy()
+    ts = (dt - epoch).dt.total_seconds().fillna(0.0).to_numpy(dtype=np.float64)
+    tr = df["total_reports"].to_numpy(dtype=np.float64)
+    du = df["distinct_users"].to_numpy(dtype=np.float64)
+    now_ts = datetime.datetime.now(datetime.timezone.utc).timestamp()
+    lr, sd, ds = _numeric_features(tr, du, ts, has_ts, now_ts)
+    df["log_reports"] = lr
+    df["sqrt_distinct_users"] = sd
+    df["days_since_last_report"] = ds
+    return df
+
 def build_dataframe(iocs: List[Dict]) -> pd.DataFrame:
     rows = [build_feature_row(it) for it in iocs]
     df = pd.DataFrame(rows)
@@ -131,7 +189,52 @@ def build_dataframe(iocs: List[Dict]) -> pd.DataFrame:
     for c in ["ptr_suspicious", "ptr_present", "whois_present"]:
         if c in df.columns:
             df[c] = df[c].fillna(0).astype(int)
-            
+
+    if not df.empty:
+        add_numeric_features(df)
+    return df
+
+# bump when build_feature_row/build_dataframe change so stale caches are ignored
+FEATURES_VERSION = 2
+CATEGORICAL_COLS = ["type", "isp", "country_iso2"]
+
+def load_features(inp: Path, outdir: Path) -> pd.DataFrame:
+    """
+    Build the feature DataFrame for `inp`, reusing a Parquet cache in `outdir`
+    keyed by the input's mtime (older caches are removed when a new one is written).
+    Needs pyarrow; without it features are rebuilt.
+    """
+    features_path = outdir / f"features_v{FEATURES_VERSION}_{inp.stat().st_mtime_ns}.parquet"
+    if features_path.exists():
+        try:
+            df = pd.read_parquet(features_path)
+            for c in CATEGORICAL_COLS:
+                df[c] = df[c].astype(str)
+            # recency is relative to now, so it is recomputed rather than cached
+            add_numeric_features(df)
+            print("Loaded cached features ->", features_path)
+            return df
+        except Exception as e:
+            print("Failed to read cached features, rebuilding:", e)
+
+    print("Loading IOCs from", inp)
+    with open(inp, "r") as f:
+        iocs = json.load(f)
+    print("Loaded", len(iocs), "IOCs")
+    df = build_dataframe(iocs)
+
+    try:
+        outdir.mkdir(parents=True, exist_ok=True)
+        cached = df.astype({c: "category" for c in CATEGORICAL_COLS})
+        cached["report_dt_raw"] = pd.to_datetime(cached["report_dt_raw"], utc=True)
+        cached.to_parquet(features_path, engine="pyarrow", compression="zstd")
+        print("Cached features ->", features_path)
+        # only the newest cache can ever match again; drop older inputs/versions
+        for old in outdir.glob("features_v*_*.parquet"):
+            if old != features_path:
+                old.unlink(missing_ok=True)
+    except Exception as e:
+        print("Skipping feature cache (is pyarrow installed?):", e)
     return df
 
 # -------------------------
@@ -141,9 +244,44 @@ def make_silver_labels(df: pd.DataFrame) -> pd.Series:
     cond = (df["abuse_confidence"] >= 100) & (df["total_reports"] >= 1000)
     return cond.astype(int)
 
+# -------------------------
+# Model persistence
+# -------------------------
+def save_model(clf, path: Path):
+    # the bare estimator, read back with joblib.load(path); compressed, so it cannot be mmapped.
+    # lz4 (in requirements.txt) keeps load time close to uncompressed; zlib is the stdlib
+    # fallback for installs without it
+    try:
+        import lz4  # noqa: F401
+        compress = ("lz4", 3)
+    except Exception:
+        compress = ("zlib", 3)
+    joblib.dump(clf, path, compress=compress, protocol=5)
+
 # -------------------------
 # Training & evaluation
 # -------------------------
+def rf_proba_pos(clf: RandomForestClassifier, X: np.ndarray) -> np.ndarray:
+    """
+    P(class=1) for a fitted binary RandomForest.
+    Same result as clf.predict_proba(X)[:, 1], but only the positive column of
+    each tree's output is accumulated instead of the full (N, n_classes) matrix.
+    """
+    from joblib import Parallel, delayed
+
+    X = np.ascontiguousarray(X, dtype=np.float32)
+    out = np.zeros(X.shape[0], dtype=np.float64)
+    lock = threading.Lock()
+
+    def _accumulate(tree):
+        pos = tree.predict_proba(X, check_input=False)[:, 1]
+        with lock:
+            np.add(out, pos, out=out)
+
+    Parallel(n_jobs=clf.n_jobs, prefer="threads")(delayed(_accumulate)(t) for t in clf.estimators_)
+    out /= len(clf.estimators_)
+    return out
+
 def train_and_evaluate(X_train: np.ndarray, X_test: np.ndarray, y_train: np.ndarray, y_test: np.ndarray, cols: List[str], outdir: Path):
     clf = RandomForestClassifier(
         n_estimators=200, 
@@ -158,7 +296,7 @@ def train_and_evaluate(X_train: np.ndarray, X_test: np.ndarray, y_train: np.ndar
     clf.fit(X_train, y_train)
     
     try:
-        y_proba = clf.predict_proba(X_test)[:, 1]
+        y_proba = rf_proba_pos(clf, X_test)
     except Exception:
         y_proba = None
 
@@ -193,6 +331,7 @@ def train_and_evaluate(X_train: np.ndarray, X_test: np.ndarray, y_train: np.ndar
         cm = confusion_matrix(y_test, y_pred)
         
         try:
+            plt = _pyplot()
             fig, ax = plt.subplots(figsize=(5,4))
             ax.plot(fpr, tpr, label=f"AUC={roc_auc_val:.4f}")
             ax.plot([0,1],[0,1], linestyle="--", color="gray")
@@ -230,6 +369,7 @@ def train_and_evaluate(X_train: np.ndarray, X_test: np.ndarray, y_train: np.ndar
     
     # Plot Confusion Matrix
     try:
+        plt = _pyplot()
         fig, ax = plt.subplots(figsize=(5,4))
         im = ax.imshow(cm, cmap="Blues")
         ax.set_xlabel("Predicted")
@@ -252,6 +392,8 @@ def train_and_evaluate(X_train: np.ndarray, X_test: np.ndarray, y_train: np.ndar
      # -------------------------
      # This checks if the predicted probabilities match reality
     try:
+        from sklearn.calibration import CalibrationDisplay
+        plt = _pyplot()
         fig = plt.figure(figsize=(5,4))
         # y_test are the labels, y_proba are the probabilities
         CalibrationDisplay.from_predictions(y_test, y_proba, n_bins=10, ax=plt.gca(), name="Random Forest")
@@ -281,7 +423,7 @@ def train_and_evaluate(X_train: np.ndarray, X_test: np.ndarray, y_train: np.ndar
         print("Failed to save feature importances:", e)
         
     model_path = outdir / "model_time_split.joblib"
-    joblib.dump({"model": clf}, model_path)
+    save_model(clf, model_path)
     print("Saved model ->", model_path)
     
     return {"classification_report": rep, "confusion_matrix": cm, "roc_auc": roc_auc_val}
@@ -300,12 +442,7 @@ def main():
         print("Input not found:", inp)
         return
     
-    print("Loading IOCs from", inp)
-    with open(inp, "r") as f:
-        iocs = json.load(f)
-    print("Loaded", len(iocs), "IOCs")
-    
-    df = build_dataframe(iocs)
+    df = load_features(inp, outdir)
     print("Built features DF shape:", df.shape)
     
     # --- STRATIFIED TEMPORAL SPLIT ---
@@ -337,8 +474,8 @@ def main():
     df_train = pd.concat([df_0_train, df_1_train])
     df_test = pd.concat([df_0_test, df_1_test])
     
-    # Shuffle Training data (models don't like sorted dates in input usually)
-    df_train = df_train.sample(frac=1, random_state=42)
+    # Training rows are shuffled after preprocessing (see below) so only the
+    # numeric matrix is permuted, not every DataFrame column.
     # Do NOT shuffle test data (keep temporal order of events)
     
     print(f"Train set size: {len(df_train)} (Benign: {len(df_0_train)}, Malicious: {len(df_1_train)})")
@@ -347,7 +484,7 @@ def main():
     # --- FEATURE PREPROCESSING ---
     
     numeric_features = ["distinct_users", "days_since_last_report", "sqrt_distinct_users"]
-    categorical_features = ["type", "isp", "country_iso2"]
+    categorical_features = CATEGORICAL_COLS
     binary_features = ["ptr_suspicious", "ptr_present", "whois_present"]
     
     ohe = make_onehot_encoder(sparse_output=False, sparse=False)
@@ -360,6 +497,7 @@ def main():
             ("cat", categorical_transformer, categorical_features),
         ],
         remainder="drop",
+        n_jobs=-1,
     )
     
     print("Fitting preprocessor on Training data only...")
@@ -384,6 +522,11 @@ def main():
     
     y_train = df_train['label'].values
     y_test = df_test['label'].values
+
+    # Shuffle Training data (models don't like sorted dates in input usually)
+    perm = np.random.default_rng(42).permutation(X_train.shape[0])
+    X_train = X_train[perm]
+    y_train = y_train[perm]
     
     results = train_and_evaluate(X_train, X_test, y_train, y_test, cols, outdir)
     
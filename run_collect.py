@@ -54,6 +54,12 @@ def load_collectors():
             print(f"Error importing collectors.{name}: {e} — skipping.")
     return discovered
 
+def _as_int(v, default=1):
+    try:
+        return int(v) if v is not None else default
+    except (TypeError, ValueError):
+        return default
+
 def run_collect(limit=None):
     collectors = load_collectors()
     all_iocs = []
@@ -73,17 +79,25 @@ def run_collect(limit=None):
         except Exception as e:
             print(f"  -> error running {c.__name__}: {e}")
 
-    # deduplicate by (type,value)
-    seen = set()
-    unique = []
+    # deduplicate by (type,value), merging later sightings into the first one
+    merged = {}
     for i in all_iocs:
         if not isinstance(i, dict):
             continue
         key = (i.get("type"), i.get("value"))
-        if key in seen:
+        m = merged.get(key)
+        if m is None:
+            merged[key] = i
             continue
-        seen.add(key)
-        unique.append(i)
+        m["sources_count"] = max(_as_int(m.get("sources_count")), _as_int(i.get("sources_count")))
+        # ISO timestamps compare correctly as strings; ignore missing values
+        firsts = [t for t in (m.get("first_seen"), i.get("first_seen")) if t]
+        lasts = [t for t in (m.get("last_seen"), i.get("last_seen")) if t]
+        if firsts:
+            m["first_seen"] = min(firsts)
+        if lasts:
+            m["last_seen"] = max(lasts)
+    unique = list(merged.values())
 
     os.makedirs(os.path.dirname(STORE_OUT), exist_ok=True)
     with open(STORE_OUT, "w") as f:
@@ -13,15 +13,19 @@ Behavior:
    [ 12/500] domain::example.com - COMPLETE ✓
 
  - Writes incremental JSONL to ./store/iocs_enriched.jsonl and final JSON to ./store/iocs_enriched.json
- - Uses a cache ./store/enrich_cache.json to avoid redoing work
+ - Uses a cache ./store/enrich_cache.json to avoid redoing work. New entries are appended
+   to ./store/enrich_cache.jsonl while running and compacted into the JSON cache on exit.
 """
 
 import os
+import sys
 import json
 import asyncio
 import aiohttp
+import orjson
 import argparse
 import time
+from collections import deque
 from functools import partial
 from math import ceil
 
@@ -32,22 +36,48 @@ STORE_IN = "./store/iocs.json"
 OUT_JSONL = "./store/iocs_enriched.jsonl"
 OUT_JSON = "./store/iocs_enriched.json"
 CACHE_FILE = "./store/enrich_cache.json"
+CACHE_LOG = "./store/enrich_cache.jsonl"
+CACHE_FLUSH_EVERY = 100
 
 # -------------------- cache helpers --------------------
+def cache_key(entry):
+    return f"{entry.get('type')}::{entry.get('value')}"
+
 def load_cache():
+    cache = {}
     if os.path.exists(CACHE_FILE):
         try:
-            with open(CACHE_FILE, "r") as f:
-                return json.load(f)
+            with open(CACHE_FILE, "rb") as f:
+                cache = orjson.loads(f.read())
         except Exception:
-            return {}
-    return {}
+            cache = {}
+    # replay entries appended since the last compaction
+    if os.path.exists(CACHE_LOG):
+        with open(CACHE_LOG, "rb") as f:
+            for ln in f:
+                try:
+                    e = orjson.loads(ln)
+                except Exception:
+                    continue  # torn last line after a crash
+                cache[cache_key(e)] = e
+    return cache
+
+def append_cache(entries):
+    """Append new cache entries to the JSONL log (linear I/O, no full rewrite)."""
+    if not entries:
+        return
+    with open(CACHE_LOG, "ab") as f:
+        for e in entries:
+            f.write(orjson.dumps(e) + b"\n")
 
-def save_cache(cache):
+def compact_cache(cache):
+    """Rewrite the full JSON cache once and drop the now-redundant JSONL log."""
     tmp = CACHE_FILE + ".tmp"
-    with open(tmp, "w") as f:
-        json.dump(cache, f, indent=2)
+    with open(tmp, "wb") as f:
+        f.write(orjson.dumps(cache, option=orjson.OPT_INDENT_2))
     os.replace(tmp, CACHE_FILE)
+    if os.path.exists(CACHE_LOG):
+        os.remove(CACHE_LOG)
 
 # -------------------- HTTP helpers --------------------
 async def http_otx_lookup(session, domain):
@@ -59,7 +89,7 @@ async def http_otx_lookup(session, domain):
     try:
         async with session.get(url, headers=headers, timeout=12) as resp:
             if resp.status == 200:
-                return await resp.json()
+                return await resp.json(loads=orjson.loads)
     except Exception:
         return {}
     return {}
@@ -74,38 +104,79 @@ async def http_abuseipdb_lookup(session, ip):
     try:
         async with session.get(url, params=params, headers=headers, timeout=12) as resp:
             if resp.status == 200:
-                return await resp.json()
+                return await resp.json(loads=orjson.loads)
     except Exception:
         return {}
     return {}
 
 # -------------------- progress printer --------------------
-async def progress_printer(queue: asyncio.Queue):
+PROGRESS_FLUSH_LINES = 50
+PROGRESS_FLUSH_SECS = 0.1
+
+class ProgressChannel:
+    """
+    Single-producer/single-consumer progress channel.
+    A deque plus an Event is enough here; put() keeps the asyncio.Queue
+    signature so enrich_local can report into it unchanged.
+    """
+    def __init__(self):
+        self._buf = deque()
+        self._ready = asyncio.Event()
+
+    async def put(self, msg):
+        self._buf.append(msg)
+        self._ready.set()
+
+    async def wait(self, timeout):
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+        self._ready.clear()
+
+    def drain(self):
+        while self._buf:
+            yield self._buf.popleft()
+
+def format_progress(msg):
+    # Format: [ 12/500] domain::example.com - DNS ✓
+    idx = msg.get("idx")
+    total = msg.get("total")
+    key = msg.get("id")
+    step = msg.get("step")
+    status = msg.get("status")
+    # use checkmark for done
+    mark = "✓" if status == "done" else status
+    if idx is not None and total is not None:
+        return f"[{idx:4d}/{total}] {key} - {step} {mark}"
+    return f"[    ] {key} - {step} {mark}"
+
+async def progress_printer(channel: ProgressChannel):
     """
     Consume progress messages and print them neatly.
     Message format (dict): {"idx": int, "total": int, "id": "type::value", "step": "...", "status": "done"}
+    Lines are buffered and written every PROGRESS_FLUSH_LINES messages or
+    PROGRESS_FLUSH_SECS seconds, so stdout sees a few writes instead of one per step.
     """
-    while True:
-        msg = await queue.get()
-        if msg is None:  # sentinel to stop
-            queue.task_done()
-            break
-        # Format: [ 12/500] domain::example.com - DNS ✓
-        idx = msg.get("idx")
-        total = msg.get("total")
-        key = msg.get("id")
-        step = msg.get("step")
-        status = msg.get("status")
-        # use checkmark for done
-        mark = "✓" if status == "done" else status
-        if idx is not None and total is not None:
-            print(f"[{idx:4d}/{total}] {key} - {step} {mark}")
-        else:
-            print(f"[    ] {key} - {step} {mark}")
-        queue.task_done()
+    lines = []
+    last_flush = time.monotonic()
+    done = False
+    while not done:
+        await channel.wait(PROGRESS_FLUSH_SECS)
+        for msg in channel.drain():
+            if msg is None:  # sentinel to stop
+                done = True
+                break
+            lines.append(format_progress(msg))
+        now = time.monotonic()
+        if lines and (done or len(lines) >= PROGRESS_FLUSH_LINES or now - last_flush >= PROGRESS_FLUSH_SECS):
+            sys.stdout.write("\n".join(lines) + "\n")
+            sys.stdout.flush()
+            lines.clear()
+            last_flush = now
 
 # -------------------- worker --------------------
-async def enrich_worker(ioc, idx, total, session, sem: asyncio.Semaphore, cache, progress_queue: asyncio.Queue, skip_whois=False, skip_http=False):
+async def enrich_worker(ioc, idx, total, session, sem: asyncio.Semaphore, cache, progress_queue: ProgressChannel, skip_whois=False, skip_http=False):
     key = f"{ioc.get('type')}::{ioc.get('value')}"
     # If cached, report and return
     if key in cache:
@@ -165,7 +236,7 @@ async def enrich_worker(ioc, idx, total, session, sem: asyncio.Semaphore, cache,
         return result
 
 # -------------------- main async flow --------------------
-async def main_async(limit, concurrency, skip_whois, skip_http):
+async def main_async(limit, concurrency, skip_whois, skip_http, compact=True):
     # load input
     try:
         with open(STORE_IN, "r") as f:
@@ -186,33 +257,48 @@ async def main_async(limit, concurrency, skip_whois, skip_http):
         return
 
     cache = load_cache()
+    persisted = set(cache)
 
     # prepare progress queue and printer
-    progress_queue = asyncio.Queue()
+    progress_queue = ProgressChannel()
     printer_task = asyncio.create_task(progress_printer(progress_queue))
 
     timeout = aiohttp.ClientTimeout(total=20)
     sem = asyncio.Semaphore(concurrency)
 
-    async with aiohttp.ClientSession(timeout=timeout) as session:
+    # one sized connector for the whole run: keep-alive connections and cached
+    # DNS for the two API hosts instead of a handshake + lookup per request
+    connector = aiohttp.TCPConnector(
+        limit=concurrency * 2,
+        limit_per_host=concurrency,
+        ttl_dns_cache=300,
+        enable_cleanup_closed=True,
+    )
+
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
         tasks = []
         for idx, ioc in enumerate(to_process, start=1):
             tasks.append(asyncio.create_task(enrich_worker(ioc, idx, total, session, sem, cache, progress_queue, skip_whois=skip_whois, skip_http=skip_http)))
 
-        # gather results in chunks so we can write incremental JSONL
+        # stream results as they finish; the semaphore inside enrich_worker
+        # bounds in-flight work, so one slow lookup never stalls the others
         results = []
-        BATCH = 100
-        for i in range(0, len(tasks), BATCH):
-            chunk = tasks[i:i+BATCH]
-            chunk_res = await asyncio.gather(*chunk)
-            results.extend(chunk_res)
-            # write chunk to JSONL
-            with open(OUT_JSONL, "a") as outf:
-                for r in chunk_res:
-                    outf.write(json.dumps(r) + "\n")
-            # persist cache incrementally
-            save_cache(cache)
-            print(f"Enriched chunk {i//BATCH + 1} ({len(results)}/{total})")
+        delta = []
+        with open(OUT_JSONL, "ab") as outf:
+            for fut in asyncio.as_completed(tasks):
+                r = await fut
+                results.append(r)
+                outf.write(orjson.dumps(r) + b"\n")
+                k = cache_key(r)
+                if k not in persisted:
+                    persisted.add(k)
+                    delta.append(r)
+                if len(results) % CACHE_FLUSH_EVERY == 0 or len(results) == total:
+                    # persist only the entries added to the cache since the last flush
+                    outf.flush()
+                    append_cache(delta)
+                    delta.clear()
+                    print(f"Enriched {len(results)}/{total}")
 
     # finalize: write aggregated JSON
     try:
@@ -222,6 +308,12 @@ async def main_async(limit, concurrency, skip_whois, skip_http):
     except Exception as e:
         print("ERROR writing final JSON:", e)
 
+    if compact:
+        try:
+            compact_cache(cache)
+        except Exception as e:
+            print("ERROR compacting cache (JSONL log kept):", e)
+
     # stop the printer
     await progress_queue.put(None)
     await printer_task
@@ -233,6 +325,7 @@ def parse_args():
     p.add_argument("--concurrency", type=int, default=50, help="Concurrent workers (default 50)")
     p.add_argument("--skip-whois", action="store_true", help="Do not perform WHOIS (faster)")
     p.add_argument("--skip-http", action="store_true", help="Skip external HTTP APIs (OTX/AbuseIPDB)")
+    p.add_argument("--no-compact", action="store_true", help="Keep the cache JSONL log instead of rewriting enrich_cache.json on exit")
     return p.parse_args()
 
 def main():
@@ -242,7 +335,7 @@ def main():
     if os.path.exists(OUT_JSONL):
         os.remove(OUT_JSONL)
     start = time.time()
-    asyncio.run(main_async(args.limit, args.concurrency, args.skip_whois, args.skip_http))
+    asyncio.run(main_async(args.limit, args.concurrency, args.skip_whois, args.skip_http, compact=not args.no_compact))
     print("Elapsed: %.1f seconds" % (time.time() - start))
 
 if __name__ == "__main__":
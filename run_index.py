@@ -7,97 +7,141 @@ Reads:
  - or ./store/iocs_enriched.jsonl (fall back, line-delimited)
 
 Writes:
- - ./store/iocs_indexed.json (final output)
+ - ./store/iocs_indexed.jsonl (one record per line)
+ - ./store/iocs_indexed.json (same records as a JSON array; skip with --no-json)
+ - ./store/iocs_indexed.sqlite (records keyed by id, indexed on score/type)
+
+Scoring, bucketing and output are done in a single streaming pass, so the
+indexed records are never all held in memory at once.
 
 This script computes:
- - a modular score_breakdown dict (components are easy to tweak)
+ - a modular score_breakdown dict (components are easy to tweak; only
+   ptr, country, final_score and the non-zero numeric entries are written
+   unless --verbose)
  - a final integer score 0-100
  - a risk_bucket ("high","medium","low")
 """
+import argparse
+import heapq
 import os
-import json
+import re
+import sqlite3
 import sys
+from contextlib import ExitStack
+from itertools import islice
+
+import numpy as np
+import orjson
+
+# optional: numba compiles the numeric scoring core into a single fused loop
+try:
+    from numba import njit
+    _NUMBA_AVAILABLE = True
+except Exception:
+    _NUMBA_AVAILABLE = False
+
+# optional: ijson streams large JSON arrays item by item
+try:
+    import ijson
+except Exception:
+    ijson = None
 
 IN_JSON = "./store/iocs_enriched.json"
 IN_JSONL = "./store/iocs_enriched.jsonl"
 OUT_INDEX = "./store/iocs_indexed.json"
+OUT_INDEX_JSONL = "./store/iocs_indexed.jsonl"
+OUT_SQLITE = "./store/iocs_indexed.sqlite"
+STREAM_MIN_BYTES = 50 * 1024 * 1024  # stream IN_JSON with ijson above this size
+SCORE_CHUNK = 10000  # IOCs scored per column batch
 
 
-def load_enriched():
+def iter_enriched():
+    """Yield enriched IOCs one at a time.
+
+    Large JSON arrays are streamed with ijson when it is installed so the raw
+    file and the parsed list never have to sit in memory together; JSONL is
+    parsed line by line with orjson.
+    """
     if os.path.exists(IN_JSON):
-        with open(IN_JSON, "r") as f:
-            return json.load(f)
+        if ijson is not None and os.path.getsize(IN_JSON) >= STREAM_MIN_BYTES:
+            with open(IN_JSON, "rb") as f:
+                yield from ijson.items(f, "item", use_float=True)
+            return
+        with open(IN_JSON, "rb") as f:
+            yield from orjson.loads(f.read())
+        return
     if os.path.exists(IN_JSONL):
-        out = []
-        with open(IN_JSONL, "r") as f:
+        with open(IN_JSONL, "rb") as f:
             for ln in f:
                 ln = ln.strip()
                 if not ln:
                     continue
                 try:
-                    out.append(json.loads(ln))
+                    yield orjson.loads(ln)
                 except Exception:
                     continue
-        return out
+        return
     print("No enriched IOCs found. Run run_enrich.py first.")
     sys.exit(1)
 
 
+def load_enriched():
+    return list(iter_enriched())
+
+
+def iter_chunks(iterable, size):
+    it = iter(iterable)
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+
 # scoring helpers
+# bucket tables: contrib = *_CONTRIB[np.digitize(x, *_BINS)] (bins are inclusive lower bounds)
+REPORTS_BINS = np.array([10, 50, 200, 500, 1000, 2000, 5000, 10000])
+REPORTS_CONTRIB = np.array([0, 2, 5, 8, 10, 12, 14, 16, 18])
+USERS_BINS = np.array([25, 100, 200, 500, 1000])
+USERS_CONTRIB = np.array([0, 3, 5, 7, 9, 10])
+
+
 def map_reports_to_contrib(r):
-    r = int(r or 0)
-    if r >= 10000:
-        return 18
-    if r >= 5000:
-        return 16
-    if r >= 2000:
-        return 14
-    if r >= 1000:
-        return 12
-    if r >= 500:
-        return 10
-    if r >= 200:
-        return 8
-    if r >= 50:
-        return 5
-    if r >= 10:
-        return 2
-    return 0
+    return int(REPORTS_CONTRIB[np.digitize(int(r or 0), REPORTS_BINS)])
 
 
 def map_users_to_contrib(u):
-    u = int(u or 0)
-    if u >= 1000:
-        return 10
-    if u >= 500:
-        return 9
-    if u >= 200:
-        return 7
-    if u >= 100:
-        return 5
-    if u >= 25:
-        return 3
-    return 0
+    return int(USERS_CONTRIB[np.digitize(int(u or 0), USERS_BINS)])
 
 
+# compiled once: a single scan of the PTR instead of lower() + one substring search per keyword
+# matched against the lower-cased PTR (cheaper than an IGNORECASE search)
+SUSPICIOUS_PTR_RE = re.compile("|".join(map(re.escape, ["scan", "security", "malware", "bot", "spammer"])))
 def ptr_heuristic(ptr):
     if not ptr:
         return 0
-    p = ptr.lower()
-    suspicious = ["scan", "security", "malware", "bot", "spammer", "scan-"]
-    for s in suspicious:
-        if s in p:
-            return 12
-    return 0
+    return 12 if SUSPICIOUS_PTR_RE.search(ptr.lower()) else 0
 
 
-HIGH_RISK_COUNTRIES = {"CN", "RU", "IR", "KP", "SY"}
+HIGH_RISK_COUNTRIES = frozenset(("CN", "RU", "IR", "KP", "SY"))
 def country_heuristic(country_iso):
     if not country_iso:
         return 0
     return 5 if country_iso.upper() in HIGH_RISK_COUNTRIES else 0
 
 
+def encode_iso2(codes):
+    """
+    Pack 2-letter country codes into uint16 as (c0 << 8) | c1, upper-cased by
+    clearing the ASCII case bit. Anything that is not a 2-char string packs to 0.
+    """
+    raw = np.array([c.encode("ascii", "replace") if isinstance(c, str) and len(c) == 2 else b"" for c in codes], dtype="S2")
+    return raw.view(">u2").astype(np.uint16) & 0xDFDF
+
+
+HIGH_RISK_U16 = encode_iso2(sorted(HIGH_RISK_COUNTRIES))
+
+
 def source_weight(src):
     if not src:
         return 5
@@ -111,127 +155,360 @@ def source_weight(src):
     return 5
 
 
-def compute_score(item):
-    # build breakdown
-    breakdown = {}
-    breakdown["base"] = 10
-    breakdown["source_weight"] = source_weight(item.get("source"))
-
-    abuse = item.get("enrichment", {}).get("abuseipdb") or item.get("enrichment", {}).get("abuse")
-    # extract abuseConfidenceScore
+def extract_signals(item):
+    """Pull the raw scoring signals out of one enriched IOC (the only per-item dict walk)."""
+    ench = item.get("enrichment") or {}
+    abuse = ench.get("abuseipdb") or ench.get("abuse")
     abuse_conf = None
+    total_reports = 0
+    distinct_users = 0
     if isinstance(abuse, dict):
-        abuse_conf = abuse.get("abuseConfidenceScore") or (abuse.get("data") or {}).get("abuseConfidenceScore") or item.get("enrichment", {}).get("abuseipdb_score")
+        # top-level fields first; the nested "data" payload is only consulted on a miss
+        abuse_conf = abuse.get("abuseConfidenceScore")
+        total_reports = abuse.get("totalReports")
+        distinct_users = abuse.get("numDistinctUsers")
+        if not (abuse_conf and total_reports and distinct_users):
+            abuse_data = abuse.get("data") or {}
+            abuse_conf = abuse_conf or abuse_data.get("abuseConfidenceScore")
+            total_reports = total_reports or abuse_data.get("totalReports")
+            distinct_users = distinct_users or abuse_data.get("numDistinctUsers")
+        abuse_conf = abuse_conf or ench.get("abuseipdb_score")
+        total_reports = int(total_reports or 0)
+        distinct_users = int(distinct_users or 0)
     try:
         abuse_conf = int(abuse_conf) if abuse_conf is not None else 0
     except Exception:
         abuse_conf = 0
-    breakdown["abuse_confidence"] = abuse_conf
-    breakdown["abuse_contrib"] = round(abuse_conf * 0.25)  # 0-25
-
-    total_reports = 0
-    distinct_users = 0
-    if isinstance(abuse, dict):
-        total_reports = int(abuse.get("totalReports") or (abuse.get("data") or {}).get("totalReports") or 0)
-        distinct_users = int(abuse.get("numDistinctUsers") or (abuse.get("data") or {}).get("numDistinctUsers") or 0)
-    breakdown["total_reports"] = total_reports
-    breakdown["total_reports_contrib"] = map_reports_to_contrib(total_reports)
-    breakdown["distinct_users"] = distinct_users
-    breakdown["distinct_users_contrib"] = map_users_to_contrib(distinct_users)
-
-    passive_dns_count = len(item.get("enrichment", {}).get("passive_dns") or [])
-    breakdown["passive_dns_count"] = passive_dns_count
-    breakdown["passive_dns_contrib"] = 0
-
-    otx_count = int(item.get("enrichment", {}).get("otx_count") or 0)
-    breakdown["otx_count"] = otx_count
-    breakdown["otx_contrib"] = min(8, otx_count)
 
-    ptr = item.get("enrichment", {}).get("reverse", {}).get("ptr")
-    breakdown["ptr"] = ptr
-    breakdown["ptr_contrib"] = ptr_heuristic(ptr)
-
-    whois_present = bool(item.get("enrichment", {}).get("whois") or item.get("enrichment", {}).get("whois_hint"))
-    breakdown["whois_present"] = 1 if whois_present else 0
-    breakdown["whois_contrib"] = 0
+    passive_dns_count = len(ench.get("passive_dns") or [])
+    otx_count = int(ench.get("otx_count") or 0)
+    ptr = (ench.get("reverse") or {}).get("ptr")
+    whois_present = bool(ench.get("whois") or ench.get("whois_hint"))
+    country_iso = (ench.get("geoip") or {}).get("country_iso")
+    return (item.get("source"), abuse_conf, total_reports, distinct_users, passive_dns_count,
+            otx_count, ptr, whois_present, country_iso)
+
+
+def _score_core_np(abuse_conf, total_reports, distinct_users, pdns, otx, fixed):
+    """
+    Numeric scoring core. `fixed` holds the per-IOC contributions already known
+    from the extraction pass (base + source + ptr + country + zero-weight terms).
+    Returns (abuse, reports, users, otx, no_signals_penalty, raw, final) arrays.
+    """
+    abuse_c = np.rint(abuse_conf * 0.25).astype(np.int64)  # 0-25
+    reports_c = REPORTS_CONTRIB[np.digitize(total_reports, REPORTS_BINS)]
+    users_c = USERS_CONTRIB[np.digitize(distinct_users, USERS_BINS)]
+    otx_c = np.minimum(8, otx)
+    # small penalty if literally zero signals
+    signals = (abuse_conf != 0) | (total_reports != 0) | (otx != 0) | (pdns != 0)
+    penalty = np.where(signals, 0, -5)
+    raw = fixed + abuse_c + reports_c + users_c + otx_c + penalty
+    return abuse_c, reports_c, users_c, otx_c, penalty, raw, np.clip(raw, 0, 100)
+
+
+if _NUMBA_AVAILABLE:
+    @njit(cache=True)
+    def _score_core(abuse_conf, total_reports, distinct_users, pdns, otx, fixed):
+        n = abuse_conf.shape[0]
+        abuse_c = np.empty(n, dtype=np.int64)
+        reports_c = np.empty(n, dtype=np.int64)
+        users_c = np.empty(n, dtype=np.int64)
+        otx_c = np.empty(n, dtype=np.int64)
+        penalty = np.empty(n, dtype=np.int64)
+        raw = np.empty(n, dtype=np.int64)
+        final = np.empty(n, dtype=np.int64)
+        for i in range(n):
+            a = abuse_conf[i]
+            r = total_reports[i]
+            u = distinct_users[i]
+            o = otx[i]
+            abuse_c[i] = np.int64(np.rint(a * 0.25))
+            # same buckets as REPORTS_BINS/USERS_BINS, as an if-ladder
+            if r >= 10000:
+                reports_c[i] = 18
+            elif r >= 5000:
+                reports_c[i] = 16
+            elif r >= 2000:
+                reports_c[i] = 14
+            elif r >= 1000:
+                reports_c[i] = 12
+            elif r >= 500:
+                reports_c[i] = 10
+            elif r >= 200:
+                reports_c[i] = 8
+            elif r >= 50:
+                reports_c[i] = 5
+            elif r >= 10:
+                reports_c[i] = 2
+            else:
+                reports_c[i] = 0
+            if u >= 1000:
+                users_c[i] = 10
+            elif u >= 500:
+                users_c[i] = 9
+            elif u >= 200:
+                users_c[i] = 7
+            elif u >= 100:
+                users_c[i] = 5
+            elif u >= 25:
+                users_c[i] = 3
+            else:
+                users_c[i] = 0
+            otx_c[i] = min(8, o)
+            penalty[i] = 0 if (a != 0 or r != 0 or o != 0 or pdns[i] != 0) else -5
+            raw[i] = fixed[i] + abuse_c[i] + reports_c[i] + users_c[i] + otx_c[i] + penalty[i]
+            final[i] = max(0, min(100, raw[i]))
+        return abuse_c, reports_c, users_c, otx_c, penalty, raw, final
+else:
+    _score_core = _score_core_np
+
+
+def score_columns(items):
+    """
+    Score a list of enriched IOCs column-wise.
+    Signals are extracted into NumPy arrays in one pass, then every contribution
+    and the final score are computed as whole-array operations. Returns a dict
+    of columns (NumPy arrays, plus lists for the string fields) indexed like `items`.
+    """
+    n = len(items)
+    src_w = np.empty(n, dtype=np.int64)
+    abuse_conf = np.empty(n, dtype=np.int64)
+    total_reports = np.empty(n, dtype=np.int64)
+    distinct_users = np.empty(n, dtype=np.int64)
+    pdns = np.empty(n, dtype=np.int64)
+    otx = np.empty(n, dtype=np.int64)
+    ptr_c = np.empty(n, dtype=np.int64)
+    whois = np.empty(n, dtype=np.int64)
+    ptrs = [None] * n
+    countries = [None] * n
+    for i, it in enumerate(items):
+        (src, abuse_conf[i], total_reports[i], distinct_users[i], pdns[i],
+         otx[i], ptrs[i], whois_present, countries[i]) = extract_signals(it)
+        src_w[i] = source_weight(src)
+        ptr_c[i] = ptr_heuristic(ptrs[i])
+        whois[i] = 1 if whois_present else 0
+    country_c = np.where(np.isin(encode_iso2(countries), HIGH_RISK_U16), 5, 0)
+
+    base = np.full(n, 10, dtype=np.int64)
+    zeros = np.zeros(n, dtype=np.int64)
+    fixed = base + src_w + ptr_c + country_c
+    abuse_c, reports_c, users_c, otx_c, penalty, raw, final = _score_core(
+        abuse_conf, total_reports, distinct_users, pdns, otx, fixed)
+
+    return {
+        "base": base,
+        "source_weight": src_w,
+        "abuse_confidence": abuse_conf,
+        "abuse_contrib": abuse_c,
+        "total_reports": total_reports,
+        "total_reports_contrib": reports_c,
+        "distinct_users": distinct_users,
+        "distinct_users_contrib": users_c,
+        "passive_dns_count": pdns,
+        "passive_dns_contrib": zeros,
+        "otx_count": otx,
+        "otx_contrib": otx_c,
+        "ptr": ptrs,
+        "ptr_contrib": ptr_c,
+        "whois_present": whois,
+        "whois_contrib": zeros,
+        "country": countries,
+        "country_contrib": country_c,
+        "no_signals_penalty": penalty,
+        "final_score_raw": raw,
+        "final_score": final,
+    }
+
+
+BREAKDOWN_KEYS = (
+    "base", "source_weight", "abuse_confidence", "abuse_contrib",
+    "total_reports", "total_reports_contrib", "distinct_users", "distinct_users_contrib",
+    "passive_dns_count", "passive_dns_contrib", "otx_count", "otx_contrib",
+    "ptr", "ptr_contrib", "whois_present", "whois_contrib", "country", "country_contrib",
+    "no_signals_penalty", "final_score_raw", "final_score",
+)
+
+
+def breakdowns(cols):
+    """Materialise the per-IOC score_breakdown dicts from score_columns() output."""
+    # tolist() once per column so the dicts hold plain Python ints
+    lists = [c.tolist() if isinstance(c, np.ndarray) else c for c in (cols[k] for k in BREAKDOWN_KEYS)]
+    return [dict(zip(BREAKDOWN_KEYS, row)) for row in zip(*lists)]
 
-    country_iso = item.get("enrichment", {}).get("geoip", {}).get("country_iso")
-    breakdown["country"] = country_iso
-    breakdown["country_contrib"] = country_heuristic(country_iso)
 
-    # small penalty if literally zero signals
-    signals = (breakdown["abuse_confidence"] or breakdown["total_reports"] or breakdown["otx_count"] or passive_dns_count)
-    breakdown["no_signals_penalty"] = -5 if not signals else 0
-
-    total_raw = (
-        breakdown["base"]
-        + breakdown["source_weight"]
-        + breakdown["abuse_contrib"]
-        + breakdown["total_reports_contrib"]
-        + breakdown["distinct_users_contrib"]
-        + breakdown["passive_dns_contrib"]
-        + breakdown["otx_contrib"]
-        + breakdown["ptr_contrib"]
-        + breakdown["country_contrib"]
-        + breakdown["whois_contrib"]
-        + breakdown["no_signals_penalty"]
-    )
-    breakdown["final_score_raw"] = total_raw
-    final_score = max(0, min(100, int(round(total_raw))))
-    breakdown["final_score"] = final_score
-
-    return final_score, breakdown
+def compute_score(item):
+    cols = score_columns([item])
+    breakdown = breakdowns(cols)[0]
+    return breakdown["final_score"], breakdown
+
+
+# risk buckets: RISK_BUCKETS[np.digitize(score, RISK_BINS)]
+RISK_BINS = np.array([40, 70])
+RISK_BUCKETS = ("low", "medium", "high")
+
+
+# always present in the compact form: the dashboard filters/groups on country and ptr,
+# stix_exporter reads final_score
+COMPACT_KEEP = frozenset(("ptr", "country", "final_score"))
+
+
+def compact_breakdown(breakdown):
+    """Keep COMPACT_KEEP plus the non-zero numeric entries (flags count: True is kept, False dropped)."""
+    return {k: v for k, v in breakdown.items() if k in COMPACT_KEEP or (isinstance(v, (int, float)) and v)}
+
+
+def make_indexed(it, score, breakdown, bucket, with_enrichment=True):
+    ench = it.get("enrichment", {})
+    out = {
+        "id": f"{it.get('type')}::{it.get('value')}",
+        "type": it.get("type"),
+        "value": it.get("value"),
+        "source": it.get("source"),
+        "sources_count": ench.get("sources_count", 1),
+        "enrichment": ench,
+        "score": score,
+        "score_breakdown": breakdown,
+        "risk_bucket": bucket,
+    }
+    if not with_enrichment:
+        # the full record stays in iocs_enriched.json under the same id
+        del out["enrichment"]
+    return out
+
+
+def iter_indexed(verbose=False, with_enrichment=True):
+    """Score enriched IOCs chunk by chunk.
+
+    Yields (records, scores, bucket_idx) per chunk, records in input order;
+    bucket_idx indexes RISK_BUCKETS. score_breakdown is compacted unless verbose.
+    """
+    for chunk in iter_chunks(iter_enriched(), SCORE_CHUNK):
+        cols = score_columns(chunk)
+        scores = cols["final_score"]
+        bucket_idx = np.digitize(scores, RISK_BINS)
+        bds = breakdowns(cols)
+        if not verbose:
+            bds = [compact_breakdown(b) for b in bds]
+        records = [
+            make_indexed(it, score, breakdown, RISK_BUCKETS[b], with_enrichment)
+            for it, score, breakdown, b in zip(chunk, scores.tolist(), bds, bucket_idx.tolist())
+        ]
+        yield records, scores, bucket_idx
+
+
+class JsonArrayWriter:
+    """Write records one at a time as an indented JSON array.
+
+    The bytes match orjson.dumps(records, option=OPT_INDENT_2), so readers of
+    the .json index see no difference, but the full list is never built.
+    """
+
+    def __init__(self, f):
+        self.f = f
+        self.n = 0
+
+    def write(self, rec):
+        body = orjson.dumps(rec, option=orjson.OPT_INDENT_2).replace(b"\n", b"\n  ")
+        self.f.write((b",\n  " if self.n else b"[\n  ") + body)
+        self.n += 1
+
+    def close(self):
+        self.f.write(b"\n]" if self.n else b"[]")
+
+
+def open_sqlite_index(path):
+    """Create a fresh SQLite index next to `path`; it is swapped in by finish_sqlite_index."""
+    tmp = path + ".tmp"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    conn = sqlite3.connect(tmp)
+    conn.execute("PRAGMA journal_mode=OFF")
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.execute("CREATE TABLE iocs(id TEXT PRIMARY KEY, type TEXT, value TEXT, score INT, json BLOB)")
+    return conn
+
+
+def finish_sqlite_index(conn, path):
+    """Build the score index and move the db into place."""
+    conn.execute("CREATE INDEX idx_score ON iocs(score, type)")
+    conn.commit()
+    conn.close()
+    os.replace(path + ".tmp", path)
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Score enriched IOCs and write the index")
+    p.add_argument("--no-json", action="store_true",
+                   help=f"Only write {OUT_INDEX_JSONL}; skip the {OUT_INDEX} array")
+    p.add_argument("--verbose", action="store_true",
+                   help="Write the full score_breakdown (default: ptr, country, final_score and non-zero numeric entries)")
+    p.add_argument("--no-enrichment", action="store_true",
+                   help="Omit the enrichment payload from indexed records (it stays in iocs_enriched.json). "
+                        "app.py, ml_rf.py and the map/figure scripts need it, so only use this for search-only indexes")
+    return p.parse_args()
 
 
 def main():
-    enriched = load_enriched()
-    print(f"Loaded {len(enriched)} enriched IOCs")
-    indexed = []
-    scores = []
-    for it in enriched:
-        score, breakdown = compute_score(it)
-        out = {
-            "id": f"{it.get('type')}::{it.get('value')}",
-            "type": it.get("type"),
-            "value": it.get("value"),
-            "source": it.get("source"),
-            "sources_count": it.get("enrichment", {}).get("sources_count", 1),
-            "enrichment": it.get("enrichment", {}),
-            "score": score,
-            "score_breakdown": breakdown
-        }
-        if score >= 70:
-            out["risk_bucket"] = "high"
-        elif score >= 40:
-            out["risk_bucket"] = "medium"
-        else:
-            out["risk_bucket"] = "low"
-        indexed.append(out)
-        scores.append(score)
-
-    os.makedirs(os.path.dirname(OUT_INDEX), exist_ok=True)
-    with open(OUT_INDEX, "w") as f:
-        json.dump(indexed, f, indent=2)
-
-    avg = (sum(scores) / len(scores)) if scores else 0
-    top = sorted(scores, reverse=True)[:5]
-    counts = {"high": 0, "medium": 0, "low": 0}
-    for it in indexed:
-        counts[it["risk_bucket"]] += 1
-    print(f"Indexed {len(indexed)} IOCs -> {OUT_INDEX}")
+    args = parse_args()
+    os.makedirs(os.path.dirname(OUT_INDEX_JSONL), exist_ok=True)
+
+    bucket_counts = np.zeros(len(RISK_BUCKETS), dtype=np.int64)
+    score_sum = 0
+    n = 0
+    top10 = []  # min-heap of (score, -seq, rec); ties keep input order
+    db = open_sqlite_index(OUT_SQLITE)
+    with ExitStack() as stack:
+        fl = stack.enter_context(open(OUT_INDEX_JSONL, "wb"))
+        fj = None
+        if not args.no_json:
+            fj = JsonArrayWriter(stack.enter_context(open(OUT_INDEX, "wb")))
+        for records, scores, bucket_idx in iter_indexed(args.verbose, not args.no_enrichment):
+            rows = []
+            for rec in records:
+                line = orjson.dumps(rec)
+                fl.write(line + b"\n")
+                rows.append((rec["id"], rec["type"], rec["value"], rec["score"], line))
+                if fj is not None:
+                    fj.write(rec)
+            db.executemany("INSERT OR REPLACE INTO iocs VALUES (?, ?, ?, ?, ?)", rows)
+
+            bucket_counts += np.bincount(bucket_idx, minlength=len(RISK_BUCKETS))
+            score_sum += int(scores.sum())
+            # only this chunk's 10 largest scores (and ties) can enter the running top 10
+            k = len(scores) - min(10, len(scores))
+            kth = np.partition(scores, k)[k]
+            for j in np.flatnonzero(scores >= kth).tolist():
+                entry = (int(scores[j]), -(n + j), records[j])
+                if len(top10) < 10:
+                    heapq.heappush(top10, entry)
+                elif entry[:2] > top10[0][:2]:
+                    heapq.heapreplace(top10, entry)
+            n += len(records)
+        if fj is not None:
+            fj.close()
+    finish_sqlite_index(db, OUT_SQLITE)
+
+    print(f"Loaded {n} enriched IOCs")
+    top_items = [rec for _, _, rec in sorted(top10, key=lambda e: e[:2], reverse=True)]
+    avg = (score_sum / n) if n else 0
+    top = [it["score"] for it in top_items[:5]]
+    outputs = [OUT_INDEX_JSONL] + ([] if args.no_json else [OUT_INDEX]) + [OUT_SQLITE]
+    print(f"Indexed {n} IOCs -> {', '.join(outputs)}")
+    counts = {b: int(bucket_counts[i]) for i, b in reversed(list(enumerate(RISK_BUCKETS)))}
     print(f"Risk buckets: {counts}")
     print(f"Avg score: {avg:.1f} Top scores: {top}")
     print("Example top 10:")
-    for it in sorted(indexed, key=lambda x: x["score"], reverse=True)[:10]:
-        abuse = it["enrichment"].get("abuseipdb") or it["enrichment"].get("abuse")
+    for it in top_items:
+        ench = it.get("enrichment") or {}
+        abuse = ench.get("abuseipdb") or ench.get("abuse")
         reports = None
         users = None
         if isinstance(abuse, dict):
             reports = abuse.get("totalReports") or (abuse.get("data") or {}).get("totalReports")
             users = abuse.get("numDistinctUsers") or (abuse.get("data") or {}).get("numDistinctUsers")
-        ptr = it["enrichment"].get("reverse", {}).get("ptr")
+        ptr = ench.get("reverse", {}).get("ptr")
         isp = (abuse or {}).get("isp") if isinstance(abuse, dict) else None
-        print(f"  {it['score']:2d} - {it['id']} (abuse:{it['score_breakdown'].get('abuse_confidence')} reports:{reports} users:{users} ptr:{ptr} isp:{isp})")
+        print(f"  {it['score']:2d} - {it['id']} (abuse:{it['score_breakdown'].get('abuse_confidence', 0)} reports:{reports} users:{users} ptr:{ptr} isp:{isp})")
 
 
 if __name__ == "__main__":
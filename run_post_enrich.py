@@ -10,7 +10,9 @@ What it does:
  - Selects IOCs with score >= --min-score OR risk_bucket == --bucket (if provided).
  - Skips entries already containing deep fields in the cache (WHOIS / OTX / AbuseIPDB).
  - Performs local enrichment (DNS/geo/reverse) + WHOIS + HTTP API lookups (OTX for domains, AbuseIPDB for IPs).
- - Updates ./store/enrich_cache.json and appends results to ./store/iocs_enriched.jsonl (incremental).
+ - Updates ./store/enrich_cache.json (replaying and then folding in the ./store/enrich_cache.jsonl
+   log that run_enrich.py, run_whois_high.py and whois_on_demand.py --merge append to)
+   and appends results to ./store/iocs_enriched.jsonl (incremental).
  - Writes aggregated ./store/iocs_enriched.json at end.
 """
 
@@ -25,24 +27,38 @@ from utils.config import Config
 
 INDEX_FILE = "./store/iocs_indexed.json"
 CACHE_FILE = "./store/enrich_cache.json"
+CACHE_LOG = "./store/enrich_cache.jsonl"
 OUT_JSONL = "./store/iocs_enriched.jsonl"
 OUT_JSON = "./store/iocs_enriched.json"
 
 # ---------------- cache helpers ----------------
 def load_cache():
+    cache = {}
     if os.path.exists(CACHE_FILE):
         try:
             with open(CACHE_FILE, "r") as f:
-                return json.load(f)
+                cache = json.load(f)
         except Exception:
-            return {}
-    return {}
+            cache = {}
+    # replay entries appended to the log since the last compaction
+    if os.path.exists(CACHE_LOG):
+        with open(CACHE_LOG, "r") as f:
+            for line in f:
+                try:
+                    e = json.loads(line)
+                except Exception:
+                    continue  # torn last line after a crash
+                cache[f"{e.get('type')}::{e.get('value')}"] = e
+    return cache
 
 def save_cache(cache):
     tmp = CACHE_FILE + ".tmp"
     with open(tmp, "w") as f:
         json.dump(cache, f, indent=2)
     os.replace(tmp, CACHE_FILE)
+    # the snapshot now holds everything the log had (load_cache replayed it)
+    if os.path.exists(CACHE_LOG):
+        os.remove(CACHE_LOG)
 
 # --------------- HTTP helpers -------------------
 async def http_otx_lookup(session, domain):
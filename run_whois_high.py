@@ -9,61 +9,159 @@ Behavior:
  - Loads ./store/iocs_indexed.json to find IOCs with score >= threshold
  - Loads ./store/enrich_cache.json (or creates it)
  - For each high IOC that lacks WHOIS enrichment, runs a safe whois lookup
-   and stores the result into enrich_cache.json and updates ./store/iocs_enriched.json
+   (up to --concurrency at once, at most one query per TLD_INTERVAL per TLD)
+ - Writes once at the end: rewrites ./store/iocs_enriched.json and enrich_cache.json
+   (folding in any pending enrich_cache.jsonl log); with --no-compact only the
+   changed entries are appended to the log and enrich_cache.json is left as is
  - Respects Config.ALLOW_PUBLIC_FETCH via utils.config if you want to guard fetching
 """
 
 import argparse
-import json
+import asyncio
 import os
 import time
+from datetime import date, datetime
+import aiohttp
+import orjson
 from utils.config import Config
-# optional whois library; we wrap it for safety
-try:
-    import whois as whois_lib
-except Exception:
-    whois_lib = None
 
 CACHE_FILE = "./store/enrich_cache.json"
+CACHE_LOG = "./store/enrich_cache.jsonl"
 AGG_FILE = "./store/iocs_enriched.json"
 INDEX_FILE = "./store/iocs_indexed.json"
+TLD_INTERVAL = 1.0  # seconds between WHOIS queries to the same TLD (politeness)
+
+_WHOIS_FIELDS = ("domain_name", "registrar", "whois_server", "creation_date", "expiration_date",
+                 "updated_date", "name_servers", "status", "emails", "org", "country")
+
+def _whois_value(v):
+    # python-whois returns datetimes (or lists of them); store ISO strings
+    if isinstance(v, (datetime, date)):
+        return v.isoformat()
+    if isinstance(v, (list, tuple)):
+        return [_whois_value(x) for x in v]
+    return v
 
 def safe_whois(domain):
-    if not whois_lib:
+    # optional whois library, imported on first use; we wrap it for safety
+    try:
+        import whois as whois_lib
+    except Exception:
         return {"error": "whois-lib-missing"}
     try:
         # python-whois returns different shapes, wrap in dict
         out = whois_lib.whois(domain)
-        # Convert object -> dict safely
-        return dict(out) if isinstance(out, dict) else {k: getattr(out, k) for k in dir(out) if not k.startswith("_")}
+        # Convert object -> dict safely; only the known WHOIS fields for non-dict results
+        if isinstance(out, dict):
+            return {k: _whois_value(v) for k, v in out.items()}
+        return {k: _whois_value(getattr(out, k, None)) for k in _WHOIS_FIELDS}
     except Exception as e:
         return {"error": f"whois-failed: {str(e)}"}
 
+def cache_key(entry):
+    return f"{entry.get('type')}::{entry.get('value')}"
+
 def load_cache():
+    cache = {}
     if os.path.exists(CACHE_FILE):
-        with open(CACHE_FILE, "r") as f:
+        with open(CACHE_FILE, "rb") as f:
             try:
-                return json.load(f)
+                cache = orjson.loads(f.read())
             except Exception:
-                return {}
-    return {}
-
-def write_cache(cache):
-    os.makedirs("./store", exist_ok=True)
-    with open(CACHE_FILE, "w") as f:
-        json.dump(cache, f, indent=2)
+                cache = {}
+    # replay entries appended since the last compaction (same log run_enrich.py writes)
+    if os.path.exists(CACHE_LOG):
+        with open(CACHE_LOG, "rb") as f:
+            for ln in f:
+                try:
+                    e = orjson.loads(ln)
+                except Exception:
+                    continue  # torn last line after a crash
+                cache[cache_key(e)] = e
+    return cache
+
+def append_jsonl(path, entries):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "ab") as f:
+        for e in entries:
+            f.write(orjson.dumps(e) + b"\n")
+
+def compact_cache(cache):
+    """Rewrite the full JSON cache once and drop the now-redundant JSONL log."""
+    tmp = CACHE_FILE + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(orjson.dumps(cache, option=orjson.OPT_INDENT_2))
+    os.replace(tmp, CACHE_FILE)
+    if os.path.exists(CACHE_LOG):
+        os.remove(CACHE_LOG)
 
 def rebuild_agg_from_cache(cache):
-    arr = list(cache.values())
-    with open(AGG_FILE, "w") as f:
-        json.dump(arr, f, indent=2)
-    print(f"Wrote aggregated enriched file: {AGG_FILE} entries={len(arr)}")
+    tmp = AGG_FILE + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(orjson.dumps(list(cache.values()), option=orjson.OPT_INDENT_2))
+    os.replace(tmp, AGG_FILE)
+    print(f"Wrote aggregated enriched file: {AGG_FILE} entries={len(cache)}")
+
+class TldRateLimiter:
+    """Space out calls sharing a key (the TLD) by at least `interval` seconds."""
+    def __init__(self, interval):
+        self.interval = interval
+        self.locks = {}
+        self.last = {}
+
+    async def wait(self, key):
+        lock = self.locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            delay = self.last.get(key, 0.0) + self.interval - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self.last[key] = time.monotonic()
+
+async def whois_one(sem, limiter, domain):
+    tld = domain.rsplit(".", 1)[-1].lower()
+    # wait for the TLD slot before taking a concurrency slot, so lookups queued
+    # behind a busy TLD don't hold the semaphore while other TLDs could run
+    await limiter.wait(tld)
+    async with sem:
+        return await asyncio.to_thread(safe_whois, domain)
+
+async def http_one(sem, session, domain):
+    async with sem:
+        try:
+            async with session.head(f"http://{domain}", allow_redirects=True) as r:
+                return {"status": r.status, "final_url": str(r.url)}
+        except Exception as e:
+            return {"error": str(e)}
+
+async def run_lookups(whois_domains, http_domains, concurrency):
+    """Run WHOIS and HTTP checks concurrently; returns ({domain: whois}, {domain: http})."""
+    sem = asyncio.Semaphore(concurrency)
+    limiter = TldRateLimiter(TLD_INTERVAL)
+    whois_res, http_res = {}, {}
+
+    async def do_whois(d):
+        whois_res[d] = await whois_one(sem, limiter, d)
+        print(f"[{len(whois_res)}/{len(whois_domains)}] WHOIS {d} done", flush=True)
+
+    async def do_http(session, d):
+        http_res[d] = await http_one(sem, session, d)
+
+    tasks = [do_whois(d) for d in whois_domains]
+    if http_domains:
+        timeout = aiohttp.ClientTimeout(total=6)
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            await asyncio.gather(*tasks, *(do_http(session, d) for d in http_domains))
+    else:
+        await asyncio.gather(*tasks)
+    return whois_res, http_res
 
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--threshold", type=int, default=75, help="score threshold to treat as high risk")
     parser.add_argument("--limit", type=int, default=500, help="max number of high iocs to whois")
+    parser.add_argument("--concurrency", type=int, default=5, help="max WHOIS/HTTP lookups in flight")
     parser.add_argument("--do-http", type=str, default="false", help="quick http check (true/false)")
+    parser.add_argument("--no-compact", action="store_true", help="Append changed entries to the cache JSONL log instead of rewriting enrich_cache.json")
     args = parser.parse_args()
 
     # guard public fetch flag
@@ -77,8 +175,8 @@ def main():
         print("Missing index file. Run run_index.py first.")
         return
 
-    with open(INDEX_FILE, "r") as f:
-        indexed = json.load(f)
+    with open(INDEX_FILE, "rb") as f:
+        indexed = orjson.loads(f.read())
 
     # find high-risk entries
     high = [i for i in indexed if (i.get("score") or 0) >= args.threshold]
@@ -87,49 +185,46 @@ def main():
 
     cache = load_cache()
 
-    updated = 0
-    for i, item in enumerate(high, start=1):
+    # work out what is missing first, then fetch it all concurrently
+    entries = {}
+    whois_domains, http_domains = [], []
+    for item in high:
         val = item.get("value")
         typ = item.get("type")
-        cache_key = f"{typ}::{val}"
-        cache_entry = cache.get(cache_key, item.copy())  # either existing enriched or basic
-
+        if typ != "domain":
+            # Only run WHOIS / HTTP checks for domains (skip for IPs)
+            continue
+        key = f"{typ}::{val}"
+        cache_entry = cache.get(key, item.copy())  # either existing enriched or basic
         ench = cache_entry.get("enrichment") or {}
+        entries[val] = (key, cache_entry, ench)
+        # if WHOIS already present with registrar/raw, skip
+        if not ench.get("whois") or (ench.get("whois") == {}):
+            whois_domains.append(val)
+        else:
+            print(f"WHOIS {val} (already present)")
+        if do_http and not ench.get("http_checked"):
+            http_domains.append(val)
 
-        # Only run WHOIS for domains (skip for IPs)
-        if typ == "domain":
-            # if WHOIS already present with registrar/raw, skip
-            if not ench.get("whois") or (ench.get("whois") == {}):
-                print(f"[{i}/{len(high)}] WHOIS {val} ...", end=" ", flush=True)
-                whois_res = safe_whois(val)
-                ench["whois"] = whois_res
-                cache_entry["enrichment"] = ench
-                cache[cache_key] = cache_entry
-                updated += 1
-                print("done")
-                # polite sleep to avoid hammering whois servers
-                time.sleep(1.0)
-            else:
-                print(f"[{i}/{len(high)}] WHOIS {val} (already present)")
-
-        # Optionally do HTTP quick check (head request) for domains
-        if do_http and typ == "domain":
-            import requests
-            if not ench.get("http_checked"):
-                try:
-                    url = f"http://{val}"
-                    r = requests.head(url, timeout=6, allow_redirects=True)
-                    ench["http_checked"] = {"status": r.status_code, "final_url": r.url}
-                except Exception as e:
-                    ench["http_checked"] = {"error": str(e)}
-                cache_entry["enrichment"] = ench
-                cache[cache_key] = cache_entry
-                updated += 1
-                time.sleep(0.25)
+    whois_res, http_res = asyncio.run(run_lookups(whois_domains, http_domains, args.concurrency))
+
+    updated = 0
+    changed = {}
+    for results, field in ((whois_res, "whois"), (http_res, "http_checked")):
+        for val, res in results.items():
+            key, cache_entry, ench = entries[val]
+            ench[field] = res
+            cache_entry["enrichment"] = ench
+            cache[key] = cache_entry
+            changed[key] = cache_entry
+            updated += 1
 
     if updated:
-        write_cache(cache)
         rebuild_agg_from_cache(cache)
+        if args.no_compact:
+            append_jsonl(CACHE_LOG, changed.values())  # replayed by the next load_cache
+        else:
+            compact_cache(cache)
         print(f"WHOIS/HTTP updated {updated} entries and wrote cache.")
     else:
         print("No updates needed (WHOIS present for all high entries).")
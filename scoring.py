@@ -1,5 +1,6 @@
 # scoring.py
 # Deterministic, reproducible scoring function
+import re
 
 def clamp(x, lo, hi):
     return max(lo, min(hi, x))
@@ -15,12 +16,13 @@ def bucketed_scale(x, lo, hi):
         return 0
     return clamp(int(x ** 0.5), lo, hi)
 
+# matched against the lower-cased PTR (cheaper than an IGNORECASE search)
+_PTR_RE = re.compile(r"scan|security|ipip|crawler")
+
 def suspicious_ptr(ptr):
     if not ptr:
         return False
-    ptr = ptr.lower()
-    keywords = ["scan", "security", "ipip", "crawler"]
-    return any(k in ptr for k in keywords)
+    return _PTR_RE.search(ptr.lower()) is not None
 
 def country_weight(enrichment):
     country = enrichment.get("geoip", {}).get("country_iso")
@@ -5,20 +5,50 @@ Search indexed IOCs by confidence score.
 Usage:
   python search_by_score.py --min 70 --max 100 --type domain --limit 200
 
+Uses the SQLite index from run_index.py when present (results ordered by
+score, highest first; equal scores in index order), otherwise scans
+iocs_indexed.jsonl / .json in file order.
+
 Outputs JSON array to stdout (pretty). You can pipe to jq or redirect to a file.
 """
 
-import json
 import argparse
+import sqlite3
 import sys
 from pathlib import Path
 
+import orjson
+
 INDEX_FILE = Path("./store/iocs_indexed.json")
+INDEX_JSONL = Path("./store/iocs_indexed.jsonl")
+INDEX_SQLITE = Path("./store/iocs_indexed.sqlite")
 
-def load_index(path):
+def search_sqlite(path, min_score, max_score, ioc_type, keyword, limit):
+    """Range-scan the score index built by run_index.py, highest scores first (ties in index order)."""
+    kw = keyword.lower() if keyword else None
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
     try:
-        with open(path, "r") as f:
-            return json.load(f)
+        rows = conn.execute(
+            "SELECT json FROM iocs WHERE score BETWEEN ? AND ? AND (? IS NULL OR type = ?)"
+            " AND (? IS NULL OR instr(lower(value), ?) > 0) ORDER BY score DESC, rowid LIMIT ?",
+            (min_score, max_score, ioc_type, ioc_type, kw, kw, limit),
+        ).fetchall()
+    finally:
+        conn.close()
+    return [orjson.loads(r[0]) for r in rows]
+
+def iter_index(path):
+    """Yield indexed IOCs from a JSON array or, for .jsonl, one record per line."""
+    path = Path(path)
+    try:
+        with open(path, "rb") as f:
+            if path.suffix == ".jsonl":
+                for ln in f:
+                    ln = ln.strip()
+                    if ln:
+                        yield orjson.loads(ln)
+            else:
+                yield from orjson.loads(f.read())
     except FileNotFoundError:
         print(f"ERROR: index file {path} not found. Run run_index.py first.", file=sys.stderr)
         sys.exit(2)
@@ -43,19 +73,36 @@ def main():
     p.add_argument("--type", type=str, choices=["domain", "ip", "hash", "url"], default=None, help="IOC type to filter")
     p.add_argument("--keyword", type=str, default=None, help="Substring to match in IOC value")
     p.add_argument("--limit", type=int, default=100, help="Maximum results to return")
-    p.add_argument("--index", type=str, default=str(INDEX_FILE), help="Path to indexed JSON file")
+    p.add_argument("--index", type=str, default=None,
+                   help=f"Path to indexed .sqlite, .json or .jsonl file "
+                        f"(default: first of {INDEX_SQLITE}, {INDEX_JSONL}, {INDEX_FILE} that exists)")
     args = p.parse_args()
 
-    docs = load_index(args.index)
-    results = []
-    for doc in docs:
-        if matches(doc, args.min, args.max, args.type, args.keyword):
-            results.append(doc)
-            if len(results) >= args.limit:
-                break
+    if args.index:
+        index = Path(args.index)
+    else:
+        index = next((pth for pth in (INDEX_SQLITE, INDEX_JSONL) if pth.exists()), INDEX_FILE)
+
+    results = None
+    if index.suffix == ".sqlite":
+        try:
+            results = search_sqlite(index, args.min, args.max, args.type, args.keyword, args.limit)
+        except sqlite3.Error as e:
+            if args.index:
+                print(f"ERROR reading index file: {e}", file=sys.stderr)
+                sys.exit(3)
+            # fall back to scanning the JSON index
+            index = INDEX_JSONL if INDEX_JSONL.exists() else INDEX_FILE
+    if results is None:
+        results = []
+        for doc in iter_index(index):
+            if matches(doc, args.min, args.max, args.type, args.keyword):
+                results.append(doc)
+                if len(results) >= args.limit:
+                    break
 
     # pretty print results
-    print(json.dumps(results, indent=2))
+    sys.stdout.write(orjson.dumps(results, option=orjson.OPT_INDENT_2).decode() + "\n")
 
 if __name__ == "__main__":
     main()
@@ -2,15 +2,26 @@
 """
 Produce a STIX 2.1 bundle from ./store/iocs_indexed.json (or ./store/iocs.json).
 Fixes pattern formatting: valid STIX object/property names and quoting for hash algorithms.
+
+Indicators are emitted as plain dicts and serialised with orjson; pass --validate
+to build them through stix2 instead (full per-object validation, much slower).
+Indicator ids are uuid5 of the IOC name, so re-exports keep stable ids; `created` and
+`valid_from` are carried over from the previous bundle for those ids, and `modified`
+only moves when the indicator's content changed (STIX 2.1 versioning).
 """
-import json
+import argparse
 import os
+import uuid
+import orjson
 from datetime import datetime, timezone
-from stix2 import Bundle, Indicator, TLP_WHITE, exceptions as stix_exceptions
 
 STORE_INDEXED = "./store/iocs_indexed.json"
 FALLBACK_STORE = "./store/iocs.json"
 OUTPUT = "./store/iocs_stix.json"
+# stix2.TLP_WHITE["id"]; fixed by the STIX 2.1 spec, so the default path never imports stix2
+TLP_WHITE_ID = "marking-definition--613f2e26-407d-48c7-9eca-b8e91df99dc9"
+# STIX 2.1 namespace for deterministic (uuid5) identifiers
+STIX_NAMESPACE = uuid.UUID("00abedb4-aa42-466c-9c01-fed23315a9b7")
 
 # mapping for MITRE (optional)
 MITRE_MAPPING = {
@@ -29,9 +40,38 @@ HASH_ALG_MAP = {
 def guess_hash_algo(hash_value):
     if not hash_value:
         return None
-    h = hash_value.strip().lower()
-    L = len(h)
-    return HASH_ALG_MAP.get(L)
+    # length alone decides the algorithm; no need to normalise the string first
+    return HASH_ALG_MAP.get(len(hash_value))
+
+
+def _ip_pattern(v):
+    # choose ipv4 vs ipv6 (very simple check)
+    if ":" in v:
+        return f"[ipv6-addr:value = '{v}']"
+    return f"[ipv4-addr:value = '{v}']"
+
+
+def _domain_pattern(v):
+    # domain-name observable
+    return f"[domain-name:value = '{v}']"
+
+
+def _hash_pattern(v):
+    alg = HASH_ALG_MAP.get(len(v))
+    if not alg:
+        raise ValueError("Unknown hash algorithm/length for value")
+    # correct quoting for algorithm name in stix pattern
+    return f"[file:hashes.'{alg}' = '{v}']"
+
+
+_PATTERN_FNS = {
+    "ip": _ip_pattern,
+    "domain": _domain_pattern,
+    "hash": _hash_pattern,
+    "file_hash": _hash_pattern,
+    "md5": _hash_pattern,
+    "sha256": _hash_pattern,
+}
 
 
 def ioc_to_pattern(ioc):
@@ -39,33 +79,85 @@ def ioc_to_pattern(ioc):
     v = ioc.get("value")
     if not t or not v:
         raise ValueError("missing type or value")
-
-    if t == "ip":
-        # choose ipv4 vs ipv6 (very simple check)
-        if ":" in v:
-            return f"[ipv6-addr:value = '{v}']"
-        else:
-            return f"[ipv4-addr:value = '{v}']"
-    if t == "domain":
-        # domain-name observable
-        return f"[domain-name:value = '{v}']"
-    if t == "hash" or t == "file_hash" or t == "md5" or t == "sha256":
-        alg = guess_hash_algo(v)
-        if not alg:
-            # fallback: try SHA-256 if length matches else raise
-            raise ValueError("Unknown hash algorithm/length for value")
-        # correct quoting for algorithm name in stix pattern
-        return f"[file:hashes.'{alg}' = '{v}']"
-    # fallback generic string match (less ideal, but valid pattern using domain-name)
-    return f"[domain-name:value = '{v}']"
+    # unknown types fall back to a generic domain-name match (less ideal, but valid)
+    return _PATTERN_FNS.get(t, _domain_pattern)(v)
 
 
 def map_mitre(ioc_type):
     return MITRE_MAPPING.get(ioc_type, [])
 
 
-def create_indicator(obj):
-    # obj expected to be an indexed IOC entry (from run_index)
+def indicator_id(name):
+    return f"indicator--{uuid.uuid5(STIX_NAMESPACE, name)}"
+
+
+def stix_timestamp(dt):
+    return dt.strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+# indicator properties whose change makes a new version (everything but the timestamps)
+CONTENT_FIELDS = ("name", "description", "pattern", "pattern_type", "pattern_version",
+                  "labels", "object_marking_refs", "x_mitre_attack_ids")
+
+
+def load_previous(path=OUTPUT):
+    """Indicators of the last export ({id: object}); empty if there is none or it is unreadable."""
+    try:
+        with open(path, "rb") as f:
+            objs = orjson.loads(f.read()).get("objects") or []
+    except Exception:
+        return {}
+    return {o["id"]: o for o in objs if isinstance(o, dict) and o.get("type") == "indicator" and "id" in o}
+
+
+def keep_versioning(fields, previous):
+    """
+    Reuse `created` / `valid_from` of the previously exported indicator with the same id
+    (created must not change across versions of an id), and its `modified` too when
+    nothing else changed. `fields` is the indicator dict (or stix2 kwargs), updated in place.
+    """
+    old = previous.get(fields["id"])
+    if not old:
+        return fields
+    fields["created"] = old.get("created", fields["created"])
+    fields["valid_from"] = old.get("valid_from", fields["valid_from"])
+    if all(old.get(k) == fields.get(k) for k in CONTENT_FIELDS):
+        fields["modified"] = old.get("modified", fields["modified"])
+    return fields
+
+
+def make_indicator_dict(obj, now_iso, previous=None):
+    """Build an indicator as a plain STIX 2.1 dict (same fields as create_indicator, no validation)."""
+    name = f"{obj.get('type')}::{obj.get('value')}"
+    try:
+        pattern = ioc_to_pattern(obj)
+    except Exception as e:
+        raise ValueError(f"Cannot build pattern for {name}: {e}")
+
+    ind = {
+        "type": "indicator",
+        "spec_version": "2.1",
+        "id": indicator_id(name),
+        "created": now_iso,
+        "modified": now_iso,
+        "name": name,
+        "description": f"Enriched IOC. Confidence: {obj.get('score', 0)}",
+        "pattern": pattern,
+        "pattern_type": "stix",
+        "pattern_version": "2.1",
+        "valid_from": now_iso,
+        "labels": ["malicious-activity"],
+        "object_marking_refs": [TLP_WHITE_ID],
+    }
+    mitre = map_mitre(obj.get("type"))
+    if mitre:
+        ind["x_mitre_attack_ids"] = mitre
+    return keep_versioning(ind, previous or {})
+
+
+def create_indicator(obj, now, previous=None):
+    # obj expected to be an indexed IOC entry (from run_index); `now` is shared by the whole export,
+    # `previous` is load_previous() (see keep_versioning)
     name = f"{obj.get('type')}::{obj.get('value')}"
     description = obj.get("score_breakdown", {}).get("final_score", None)
     try:
@@ -74,22 +166,27 @@ def create_indicator(obj):
         raise ValueError(f"Cannot build pattern for {name}: {e}")
 
     kwargs = {
+        "id": indicator_id(name),
         "name": name,
         "pattern": pattern,
         "pattern_type": "stix",
         "pattern_version": "2.1",
         "description": f"Enriched IOC. Confidence: {obj.get('score', 0)}",
-        "created": datetime.now(timezone.utc),
-        "modified": datetime.now(timezone.utc),
+        "created": now,
+        "modified": now,
         "labels": ["malicious-activity"],
-        "valid_from": datetime.now(timezone.utc),
+        "valid_from": now,
         # NOTE: object_marking_refs requires existing marking definition id. Use TLP_WHITE
-        "object_marking_refs": [TLP_WHITE["id"]],
+        "object_marking_refs": [TLP_WHITE_ID],
     }
     # custom properties
     mitre = map_mitre(obj.get("type"))
     if mitre:
         kwargs["x_mitre_attack_ids"] = mitre
+    keep_versioning(kwargs, previous or {})
+
+    # stix2 is only needed for --validate
+    from stix2 import Indicator, exceptions as stix_exceptions
 
     # allow custom so x_mitre_attack_ids accepted
     try:
@@ -102,30 +199,49 @@ def create_indicator(obj):
         raise ValueError(f"stix2 extra props for {name}: {e}")
 
 
+def parse_args():
+    p = argparse.ArgumentParser(description="Export indexed IOCs as a STIX 2.1 bundle")
+    p.add_argument("--validate", action="store_true",
+                   help="Build every object through stix2 with full validation (slow)")
+    return p.parse_args()
+
+
 def main():
+    args = parse_args()
     store_file = STORE_INDEXED if os.path.exists(STORE_INDEXED) else (FALLBACK_STORE if os.path.exists(FALLBACK_STORE) else None)
     if not store_file:
         print("No source file found (iocs_indexed.json or iocs.json). Run pipeline first.")
         return
 
-    with open(store_file, "r") as f:
-        objs = json.load(f)
+    with open(store_file, "rb") as f:
+        objs = orjson.loads(f.read())
 
+    now = datetime.now(timezone.utc)
+    now_iso = stix_timestamp(now)
+    previous = load_previous()
     indicators = []
     skipped = 0
     for o in objs:
         try:
-            ind = create_indicator(o)
+            if args.validate:
+                ind = create_indicator(o, now, previous)
+            else:
+                ind = make_indicator_dict(o, now_iso, previous)
             indicators.append(ind)
         except Exception as e:
             skipped += 1
             print(f"Skipping IOC {o.get('type')}::{o.get('value')}: {e}")
 
-    bundle = Bundle(objects=indicators, allow_custom=True)
-    with open(OUTPUT, "w") as f:
-        f.write(bundle.serialize(pretty=True))
+    if args.validate:
+        from stix2 import Bundle
+        bundle = Bundle(objects=indicators, allow_custom=True)
+        data = bundle.serialize(pretty=True).encode()
+    else:
+        bundle = {"type": "bundle", "id": f"bundle--{uuid.uuid4()}", "objects": indicators}
+        data = orjson.dumps(bundle, option=orjson.OPT_INDENT_2)
+    with open(OUTPUT, "wb") as f:
+        f.write(data)
     print(f"STIX bundle written: {OUTPUT} (indicators: {len(indicators)}, skipped: {skipped})")
 
-
 if __name__ == "__main__":
     main()
@@ -1,30 +1,59 @@
 # utils/cache.py
 import os
 import json
+import sqlite3
+import threading
 import time
+
+import orjson
 try:
-    import redis
+    import msgpack
 except Exception:
-    redis = None
+    msgpack = None
 
 from .config import Config
 
+
+def _pack(value):
+    """Serialise a value for Redis: msgpack when installed, JSON otherwise."""
+    if msgpack is not None:
+        return msgpack.packb(value, use_bin_type=True)
+    return json.dumps(value)
+
+
+def _unpack(val):
+    if msgpack is not None:
+        return msgpack.unpackb(val, raw=False)
+    return json.loads(val)
+
 class Cache:
     """
-    Simple cache wrapper: uses Redis if configured, otherwise simple on-disk JSON cache.
-    Methods: get(key) -> value or None, set(key, value, ttl_seconds)
+    Simple cache wrapper: uses Redis if configured, otherwise an on-disk cache.
+    The on-disk cache is a single SQLite file (./.cache/cache.sqlite, WAL mode);
+    set CACHE_BACKEND=json for the legacy one-JSON-file-per-key layout.
+    Methods: get(key) -> value or None, set(key, value, ttl_seconds),
+             mset({key: value, ...}, ttl_seconds) for bulk writes
     """
     def __init__(self):
         self.cache_dir = "./.cache"
         os.makedirs(self.cache_dir, exist_ok=True)
         self.use_redis = False
-        if redis and Config.REDIS_HOST:
+        if Config.REDIS_HOST:
             try:
+                import redis  # optional; only needed when Redis is configured
                 self.r = redis.Redis(host=Config.REDIS_HOST, port=Config.REDIS_PORT, db=0, socket_connect_timeout=2)
                 self.r.ping()
                 self.use_redis = True
             except Exception:
                 self.use_redis = False
+        self.db = None
+        if not self.use_redis and Config.CACHE_BACKEND != "json":
+            self._lock = threading.Lock()
+            self.db = sqlite3.connect(os.path.join(self.cache_dir, "cache.sqlite"),
+                                      timeout=30, check_same_thread=False, isolation_level=None)
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("PRAGMA synchronous=NORMAL")
+            self.db.execute("CREATE TABLE IF NOT EXISTS kv(key TEXT PRIMARY KEY, expiry REAL, value BLOB)")
 
     def _path(self, key):
         safe = key.replace("/", "_").replace(":", "_")
@@ -36,7 +65,19 @@ class Cache:
             if not val:
                 return None
             try:
-                return json.loads(val)
+                return _unpack(val)
+            except Exception:
+                return None
+        elif self.db is not None:
+            try:
+                with self._lock:
+                    row = self.db.execute("SELECT expiry, value FROM kv WHERE key = ?", (key,)).fetchone()
+                    if row is None:
+                        return None
+                    if time.time() > row[0]:
+                        self.db.execute("DELETE FROM kv WHERE key = ?", (key,))
+                        return None
+                return orjson.loads(row[1])
             except Exception:
                 return None
         else:
@@ -59,8 +100,37 @@ class Cache:
 
     def set(self, key, value, ttl=3600):
         if self.use_redis:
-            self.r.setex(key, ttl, json.dumps(value))
+            self.r.setex(key, ttl, _pack(value))
+        elif self.db is not None:
+            blob = orjson.dumps(value)
+            with self._lock:
+                self.db.execute("INSERT OR REPLACE INTO kv(key, expiry, value) VALUES (?, ?, ?)",
+                                (key, time.time() + ttl, blob))
         else:
             p = self._path(key)
             with open(p, "w") as f:
                 json.dump({"_expiry": time.time() + ttl, "value": value}, f)
+
+    def mset(self, items, ttl=3600):
+        """Set many keys with one round trip (Redis pipeline / one SQLite transaction)."""
+        if not items:
+            return
+        if self.use_redis:
+            p = self.r.pipeline(transaction=False)
+            for k, v in items.items():
+                p.setex(k, ttl, _pack(v))
+            p.execute()
+        elif self.db is not None:
+            expiry = time.time() + ttl
+            rows = [(k, expiry, orjson.dumps(v)) for k, v in items.items()]
+            with self._lock:
+                self.db.execute("BEGIN")
+                try:
+                    self.db.executemany("INSERT OR REPLACE INTO kv(key, expiry, value) VALUES (?, ?, ?)", rows)
+                    self.db.execute("COMMIT")
+                except Exception:
+                    self.db.execute("ROLLBACK")
+                    raise
+        else:
+            for k, v in items.items():
+                self.set(k, v, ttl=ttl)
@@ -1,25 +1,67 @@
 # utils/config.py
+import functools
 import os
-from dotenv import load_dotenv
+from dataclasses import dataclass
 
-load_dotenv()  # Load .env file
+# Load .env only when one exists (cwd or repo root); containerised runs already
+# have the environment populated and skip importing python-dotenv entirely.
+_ENV_FILES = (".env", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".env"))
+_env_file = next((p for p in _ENV_FILES if os.path.exists(p)), None)
+if _env_file:
+    from dotenv import load_dotenv
+    load_dotenv(_env_file)
+
+_TRUE_SET = frozenset(("1", "true", "yes", "on"))
+
+
+def _truthy(v):
+    return str(v).lower() in _TRUE_SET
+
+
+@dataclass(frozen=True, slots=True)
+class Settings:
+    """Central configuration for the OSINT pipeline, parsed once from the environment"""
+    DEMO_MODE: bool
+    LOG_LEVEL: str
+    APP_HOST: str
+    APP_PORT: int
+    REDIS_HOST: str
+    REDIS_PORT: int
+    CACHE_BACKEND: str  # "sqlite" or legacy "json" (file per key)
+    OPENSEARCH_HOST: str
+    OPENSEARCH_INDEX: str
+    GEOIP_DB_PATH: str
+    OTX_API_KEY: str
+    ABUSEIPDB_API_KEY: str
+    SCHEDULE_INTERVAL_MIN: int
+    STIX_TLP: str
+    ALLOW_PUBLIC_FETCH: bool
+
+    @classmethod
+    @functools.cache
+    def instance(cls):
+        env = os.getenv
+        return cls(
+            DEMO_MODE=_truthy(env("DEMO_MODE", "True")),
+            LOG_LEVEL=env("LOG_LEVEL", "INFO"),
+            APP_HOST=env("APP_HOST", "0.0.0.0"),
+            APP_PORT=int(env("APP_PORT", 8080)),
+            REDIS_HOST=env("REDIS_HOST", ""),
+            REDIS_PORT=int(env("REDIS_PORT") or 6379),
+            CACHE_BACKEND=env("CACHE_BACKEND", "sqlite").lower(),
+            OPENSEARCH_HOST=env("OPENSEARCH_HOST", "http://opensearch:9200"),
+            OPENSEARCH_INDEX=env("OPENSEARCH_INDEX", "osint-iocs"),
+            GEOIP_DB_PATH=env("GEOIP_DB_PATH", "geolite2/GeoLite2-City.mmdb"),
+            OTX_API_KEY=env("OTX_API_KEY", ""),
+            ABUSEIPDB_API_KEY=env("ABUSEIPDB_API_KEY", ""),
+            SCHEDULE_INTERVAL_MIN=int(env("SCHEDULE_INTERVAL_MINUTES") or 15),
+            STIX_TLP=env("STIX_TLP", "AMBER"),
+            ALLOW_PUBLIC_FETCH=_truthy(env("ALLOW_PUBLIC_FETCH", "true")),
+        )
+
+
+# existing code reads settings as attributes (Config.OTX_API_KEY), so expose the shared instance
+Config = Settings.instance()
 
 # Module-level DEMO_MODE for easy imports
-DEMO_MODE = os.getenv("DEMO_MODE", "True").lower() in ("1", "true", "yes")
-
-class Config:
-    """Central configuration class for the OSINT pipeline"""
-    DEMO_MODE = DEMO_MODE
-    LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
-    APP_HOST = os.getenv("APP_HOST", "0.0.0.0")
-    APP_PORT = int(os.getenv("APP_PORT", 8080))
-    REDIS_HOST = os.getenv("REDIS_HOST", "")
-    REDIS_PORT = int(os.getenv("REDIS_PORT") or 6379)
-    OPENSEARCH_HOST = os.getenv("OPENSEARCH_HOST", "http://opensearch:9200")
-    OPENSEARCH_INDEX = os.getenv("OPENSEARCH_INDEX", "osint-iocs")
-    GEOIP_DB_PATH = os.getenv("GEOIP_DB_PATH", "geolite2/GeoLite2-City.mmdb")
-    OTX_API_KEY = os.getenv("OTX_API_KEY", "")
-    ABUSEIPDB_API_KEY = os.getenv("ABUSEIPDB_API_KEY", "")
-    SCHEDULE_INTERVAL_MIN = int(os.getenv("SCHEDULE_INTERVAL_MINUTES") or 15)
-    STIX_TLP = os.getenv("STIX_TLP", "AMBER")
-    ALLOW_PUBLIC_FETCH = os.getenv("ALLOW_PUBLIC_FETCH", "true").lower() in ("1", "true", "yes")
+DEMO_MODE = Config.DEMO_MODE
@@ -0,0 +1,64 @@
+# utils/indexed_store.py
+"""
+Columnar (structure-of-arrays) view of the indexed IOC list.
+
+iocs_indexed.json is a list of dicts; consumers that filter or score the whole
+list walk every dict field by field. build_store() turns the list into one
+NumPy column per field instead, so filters become boolean masks over
+contiguous arrays:
+
+  store = build_store(iocs)                              # any iterable of dicts
+  idx = np.flatnonzero(store["score"] >= 70)
+  rows(store, idx)                                       # back to small dicts
+  top_by_score(store, store["score"] >= 70, k=100)       # top 100, highest first
+"""
+
+import numpy as np
+
+# identity fields kept as object columns (Python str), in row order
+ID_FIELDS = ("type", "value", "source")
+
+
+def build_store(iocs):
+    """
+    Columns for an iterable of indexed IOC dicts (anything that is not a dict is skipped).
+    The iterable is consumed in one pass and the records themselves are not kept, so a
+    streamed index never sits in memory whole.
+    """
+    iocs = (it for it in iocs if isinstance(it, dict))
+    ids = {k: [] for k in ID_FIELDS}
+    score, bucket = [], []
+    for it in iocs:
+        for k, col in ids.items():
+            col.append(it.get(k))
+        score.append(it.get("score") or 0)
+        bucket.append((it.get("risk_bucket") or "").lower())
+    store = {k: np.array(col, dtype=object) for k, col in ids.items()}
+    store["score"] = np.array(score, dtype=np.int32)
+    store["risk_bucket"] = np.array(bucket, dtype=object)
+    return store
+
+
+def top_by_score(store, mask, k=None):
+    """
+    Row indices selected by `mask`, highest score first (ties keep index order, like a
+    stable sort), cut to the top `k`. For k well below the selection size only a
+    partition (O(n)) plus a sort of ~k rows is done instead of a full sort.
+    """
+    idx = np.flatnonzero(mask)
+    if k is not None and k <= 0:
+        return idx[:0]
+    score = store["score"][idx]
+    if k is not None and k < len(idx):
+        kth = np.partition(score, len(score) - k)[len(score) - k]  # k-th largest score
+        above = score > kth
+        ties = np.flatnonzero(score == kth)[: k - int(above.sum())]
+        keep = np.sort(np.concatenate([np.flatnonzero(above), ties]))
+        idx, score = idx[keep], score[keep]
+    return idx[np.argsort(-score, kind="stable")]
+
+
+def rows(store, idx):
+    """Rebuild {type, value, source, score, risk_bucket} dicts for the given row indices."""
+    cols = [(k, store[k][idx].tolist()) for k in ID_FIELDS + ("score", "risk_bucket")]
+    return [dict(zip((k for k, _ in cols), vals)) for vals in zip(*(v for _, v in cols))]
@@ -0,0 +1,63 @@
+# utils/kvstore.py
+import os
+import sqlite3
+
+import orjson
+
+
+class KVStore:
+    """
+    Persistent key/value store: one SQLite file, one row per key, orjson-encoded values.
+    Reads are point lookups and writes only touch the rows that changed, so large
+    caches never have to be parsed or rewritten as a whole.
+    Methods: get(key, default), `key in store`, put(key, value), put_many(items), keys(), close()
+    """
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.db = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS kv(key TEXT PRIMARY KEY, value BLOB)")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __contains__(self, key):
+        return self.db.execute("SELECT 1 FROM kv WHERE key = ?", (key,)).fetchone() is not None
+
+    def __len__(self):
+        return self.db.execute("SELECT COUNT(*) FROM kv").fetchone()[0]
+
+    def get(self, key, default=None):
+        row = self.db.execute("SELECT value FROM kv WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return default
+        return orjson.loads(row[0])
+
+    def put(self, key, value):
+        self.db.execute("INSERT OR REPLACE INTO kv(key, value) VALUES (?, ?)", (key, orjson.dumps(value)))
+
+    def put_many(self, items):
+        """Write many (key, value) pairs (or a dict) in a single transaction."""
+        if isinstance(items, dict):
+            items = items.items()
+        rows = [(k, orjson.dumps(v)) for k, v in items]
+        if not rows:
+            return
+        self.db.execute("BEGIN")
+        try:
+            self.db.executemany("INSERT OR REPLACE INTO kv(key, value) VALUES (?, ?)", rows)
+            self.db.execute("COMMIT")
+        except Exception:
+            self.db.execute("ROLLBACK")
+            raise
+
+    def keys(self):
+        return [r[0] for r in self.db.execute("SELECT key FROM kv")]
+
+    def close(self):
+        self.db.close()
@@ -12,12 +12,34 @@ Key improvements over previous version:
  - add reports-per-user (density) signal (log-scaled)
  - domain-specific age-based signal (younger domains get more weight)
  - small rebalancing of contribution caps to spread scores more
+
+score_iocs_batch() scores a list of IOCs at once: raw signals are pulled out of
+each IOC in one pass (signal_columns), then every contribution is computed per
+column with NumPy. It also accepts those signal columns directly. score_ioc() is
+the same computation for a single IOC, done on plain scalars (_score_row, which is
+also the numba kernel's per-row body).
 """
 
-from math import log10
 from datetime import datetime, timezone
+from functools import lru_cache
+import math
 import re
 
+import numpy as np
+
+# optional: numba compiles the numeric scoring core into a single fused loop, split across cores
+try:
+    from numba import njit, prange
+    _NUMBA_AVAILABLE = True
+except Exception:
+    _NUMBA_AVAILABLE = False
+
+# optional: pyahocorasick matches every keyword in one pass over the string
+try:
+    import ahocorasick
+except Exception:
+    ahocorasick = None
+
 def _num(v, default=0):
     try:
         if v is None:
@@ -31,7 +53,7 @@ PTR_SUSPICIOUS_KEYWORDS = [
     "malicious", "suspicious", "spam", "mail", "proxy", "tor", "vpn"
 ]
 
-HIGH_RISK_COUNTRIES = {"IR", "RU", "CN", "KP", "SY", "VN"}
+HIGH_RISK_COUNTRIES = frozenset({"IR", "RU", "CN", "KP", "SY", "VN"})
 
 # common cloud / hosting ISP keywords to detect cloud hosts and reduce weight
 CLOUD_KEYWORDS = [
@@ -40,13 +62,41 @@ CLOUD_KEYWORDS = [
     "hetzner", "scaleway", "rackspace", "oracle", "aliyun", "tencent"
 ]
 
+# one matcher per keyword list, built once at import and run on the lower-cased string, so
+# results are identical to a loop of `in` checks: an Aho-Corasick automaton when pyahocorasick
+# is installed (one pass regardless of keyword count), else a regex alternation
+def _keyword_matcher(keywords):
+    if ahocorasick is not None:
+        ac = ahocorasick.Automaton()
+        for k in keywords:
+            ac.add_word(k, k)
+        ac.make_automaton()
+        return lambda s: next(ac.iter(s), None) is not None
+    rx = re.compile("|".join(map(re.escape, keywords)))
+    return lambda s: rx.search(s) is not None
+
+_ptr_match = _keyword_matcher(PTR_SUSPICIOUS_KEYWORDS)
+_cloud_match = _keyword_matcher(CLOUD_KEYWORDS)
+
+def _encode_iso2(codes):
+    """
+    Pack 2-letter country codes into uint16 as (c0 << 8) | c1, upper-cased by
+    clearing the ASCII case bit. Anything that is not a 2-char string packs to 0.
+    """
+    raw = np.array([c.encode("ascii", "replace") if isinstance(c, str) and len(c) == 2 else b"" for c in codes], dtype="S2")
+    return raw.view(">u2").astype(np.uint16) & 0xDFDF
+
+# sorted, for np.searchsorted membership tests
+_HIGH_RISK_U16 = np.sort(_encode_iso2(HIGH_RISK_COUNTRIES))
+
+def _in_sorted(values, table):
+    """Elementwise `values in table` for a sorted 1-d table (one binary search per value)."""
+    pos = np.minimum(np.searchsorted(table, values), len(table) - 1)
+    return table[pos] == values
+
 # tries to parse ISO datetime strings including timezone
 def _parse_dt(s):
-    if not s:
-        return None
     try:
-        # some strings sometimes include extra whitespace/newlines
-        s = str(s).strip()
         # Python's fromisoformat handles "YYYY-MM-DDTHH:MM:SS+00:00"
         return datetime.fromisoformat(s)
     except Exception:
@@ -59,90 +109,71 @@ def _parse_dt(s):
                 return None
     return None
 
-def score_ioc(ioc):
-    """
-    Input: ioc dict (expected to have 'type','value','enrichment')
-    Returns: (final_score:int 0..100, breakdown:dict)
-    """
+def parse_dt(s):
+    if not s:
+        return None
+    # some strings sometimes include extra whitespace/newlines
+    return _parse_dt(str(s).strip())
+
+# POSIX timestamp of a date string (naive values are taken as UTC); memoised because
+# feeds repeat the same timestamps (callers go through parse_ts, which normalises first)
+@lru_cache(maxsize=131072)
+def _parse_ts(s):
+    parsed = _parse_dt(s)
+    if parsed is None:
+        return None
+    try:
+        return parsed.replace(tzinfo=parsed.tzinfo or timezone.utc).timestamp()
+    except Exception:
+        return None
+
+def parse_ts(s):
+    if not s:
+        return None
+    # str() keeps unhashable values (lists, dicts) out of the cache
+    return _parse_ts(str(s).strip())
+
+def _days_since(ts, now_ts):
+    """Whole days between two POSIX timestamps (floored, like timedelta.days)."""
+    return math.floor((now_ts - ts) / 86400)
+
+def _source_weight(src):
+    if "abuseipdb" in src:
+        return 4
+    if "otx" in src or "alienvault" in src:
+        return 3
+    if "github" in src or "rss" in src:
+        return 1
+    return 0
+
+def _extract_signals(ioc, now_ts):
+    """Pull the raw scoring signals out of one IOC (the only per-item dict walk)."""
     ench = ioc.get("enrichment") or {}
     typ = (ioc.get("type") or "").lower()
+    abuse = ench.get("abuseipdb")
 
-    breakdown = {}
-    score = 10
-    breakdown["base"] = 10
-
-    # Source weight
+    # Source (weighted per distinct source string in signal_columns)
     src = (ioc.get("source") or "").lower()
-    src_weight = 0
-    if "abuseipdb" in src:
-        src_weight = 4
-    elif "otx" in src or "alienvault" in src:
-        src_weight = 3
-    elif "github" in src or "rss" in src:
-        src_weight = 1
-    breakdown["source_weight"] = src_weight
-    score += src_weight
-
-    # AbuseIPDB abuseConfidenceScore (bounded, reduced weight)
+
+    # AbuseIPDB abuseConfidenceScore
     abuse_conf = None
-    if isinstance(ench.get("abuseipdb"), dict):
-        abuse_conf = ench["abuseipdb"].get("abuseConfidenceScore")
+    if isinstance(abuse, dict):
+        abuse_conf = abuse.get("abuseConfidenceScore")
     if abuse_conf is None:
         abuse_conf = ench.get("abuseipdb_score")
     abuse_conf = int(_num(abuse_conf, 0))
-    # smaller multiplier than before: 100 -> ~20
-    abuse_contrib = int(min(24, round(abuse_conf * 0.2)))
-    breakdown["abuse_confidence"] = abuse_conf
-    breakdown["abuse_contrib"] = abuse_contrib
-    score += abuse_contrib
-
-    # totalReports -> log-scale (0..18)
-    total_reports = int(_num((ench.get("abuseipdb") or {}).get("totalReports") or ench.get("abuse_totalReports") or 0, 0))
-    if total_reports > 0:
-        total_reports_contrib = int(min(18, round(log10(total_reports + 1) * 4.0)))
-    else:
-        total_reports_contrib = 0
-    breakdown["total_reports"] = total_reports
-    breakdown["total_reports_contrib"] = total_reports_contrib
-    score += total_reports_contrib
-
-    # distinct users -> log scale (0..12)
-    distinct = int(_num((ench.get("abuseipdb") or {}).get("numDistinctUsers") or ench.get("abuse_numDistinctUsers") or 0, 0))
-    if distinct > 0:
-        distinct_contrib = int(min(12, round(log10(distinct + 1) * 3.2)))
-    else:
-        distinct_contrib = 0
-    breakdown["distinct_users"] = distinct
-    breakdown["distinct_users_contrib"] = distinct_contrib
-    score += distinct_contrib
-
-    # reports per distinct user (density) -> 0..8 (high density more suspicious)
-    rp = 0
-    if distinct > 0:
-        rp = total_reports / max(1, distinct)
-    rp_contrib = int(min(8, round(log10(rp + 1) * 2.5))) if rp > 0 else 0
-    breakdown["reports_per_user"] = float(rp)
-    breakdown["reports_per_user_contrib"] = rp_contrib
-    score += rp_contrib
-
-    # Passive DNS count -> 0..8
+
+    total_reports = int(_num((abuse or {}).get("totalReports") or ench.get("abuse_totalReports") or 0, 0))
+    distinct = int(_num((abuse or {}).get("numDistinctUsers") or ench.get("abuse_numDistinctUsers") or 0, 0))
+
     pdns = ench.get("passive_dns") or []
     pdns_count = len(pdns) if isinstance(pdns, list) else 0
-    pdns_contrib = int(min(8, pdns_count * 1))
-    breakdown["passive_dns_count"] = pdns_count
-    breakdown["passive_dns_contrib"] = pdns_contrib
-    score += pdns_contrib
 
-    # OTX/AlienVault pulse_count -> 0..8
-    otx_count = 0
+    # OTX/AlienVault pulse_count
     if isinstance(ench.get("otx"), dict):
         otx_count = int(_num(ench["otx"].get("pulse_count") or ench["otx"].get("count") or 0, 0))
     else:
         otx_count = int(_num(ench.get("otx_count") or 0, 0))
-    otx_contrib = int(min(8, otx_count * 2))  # small multiplier but bounded
-    breakdown["otx_count"] = otx_count
-    breakdown["otx_contrib"] = otx_contrib
-    score += otx_contrib
 
     # PTR heuristics
     ptr = None
@@ -151,136 +182,326 @@ def score_ioc(ioc):
     if not ptr:
         if isinstance(ench.get("reverse"), str):
             ptr = ench.get("reverse")
-    ptr_contrib = 0
-    ptr_flag = 0
-    if ptr:
-        ptr_lower = str(ptr).lower()
-        for kw in PTR_SUSPICIOUS_KEYWORDS:
-            if kw in ptr_lower:
-                ptr_flag = 1
-                ptr_contrib = 10
-                break
-    breakdown["ptr"] = ptr or None
-    breakdown["ptr_contrib"] = ptr_contrib
-    score += ptr_contrib
-
-    # ISP/cloud penalty to reduce noisy cloud hosts
-    isp = (ench.get("abuseipdb") or {}).get("isp") or ench.get("abuse_isp") or ""
-    isp_lower = (isp or "").lower()
-    cloud_flag = 0
-    cloud_penalty = 0
-    for kw in CLOUD_KEYWORDS:
-        if kw in isp_lower:
-            cloud_flag = 1
-            cloud_penalty = 8  # penalize noisy cloud providers
-            break
-    breakdown["isp"] = isp or None
-    breakdown["cloud_flag"] = cloud_flag
-    breakdown["cloud_penalty"] = -cloud_penalty
-    score -= cloud_penalty  # subtract penalty
-
-    # WHOIS presence and domain-age (domain specific)
+    ptr_flag = 1 if ptr and _ptr_match(str(ptr).lower()) else 0
+
+    # ISP/cloud flag
+    isp = (abuse or {}).get("isp") or ench.get("abuse_isp") or ""
+    cloud_flag = 1 if isp and _cloud_match(isp.lower()) else 0
+
+    # WHOIS presence and domain-age (domain specific); whois_on_demand nests the
+    # fields under "parsed" (and drops "raw" with --compact)
     whois_obj = ench.get("whois") or {}
     whois_present = 0
-    whois_contrib = 0
-    domain_age_contrib = 0
-    if typ == "domain":
-        # treat whois presence as signal
-        if isinstance(whois_obj, dict) and (whois_obj.get("registrar") or whois_obj.get("creation_date") or whois_obj.get("raw")):
+    has_age = False
+    age_days = None
+    if typ == "domain" and isinstance(whois_obj, dict):
+        parsed_whois = whois_obj.get("parsed")
+        if not isinstance(parsed_whois, dict):
+            parsed_whois = {}
+        registrar = whois_obj.get("registrar") or parsed_whois.get("registrar")
+        creation = (whois_obj.get("creation_date") or whois_obj.get("created")
+                    or parsed_whois.get("creation_date") or parsed_whois.get("created"))
+        if registrar or creation or whois_obj.get("raw"):
             whois_present = 1
-            whois_contrib = 6
-            # try domain creation_date -> reward very young domains
-            creation = whois_obj.get("creation_date") or whois_obj.get("created")
             # Some whois libs return list
             if isinstance(creation, list) and creation:
                 creation = creation[0]
-            parsed = None
-            if creation:
-                parsed = _parse_dt(creation)
-            if parsed:
-                try:
-                    age_days = (datetime.now(timezone.utc) - parsed.replace(tzinfo=parsed.tzinfo or timezone.utc)).days
-                except Exception:
-                    # fallback naive
-                    try:
-                        age_days = (datetime.now() - parsed).days
-                    except Exception:
-                        age_days = None
-                if age_days is not None:
-                    if age_days <= 30:
-                        domain_age_contrib = 8
-                    elif age_days <= 365:
-                        domain_age_contrib = 4
-                    else:
-                        domain_age_contrib = 0
-                breakdown["domain_age_days"] = age_days
-    breakdown["whois_present"] = whois_present
-    breakdown["whois_contrib"] = whois_contrib
-    breakdown["domain_age_contrib"] = domain_age_contrib
-    score += whois_contrib + domain_age_contrib
-
-    # Recency of lastReportedAt (AbuseIPDB) - favors recently reported items
-    last_rep = (ench.get("abuseipdb") or {}).get("lastReportedAt") or ench.get("abuse_lastReportedAt")
-    recency_contrib = 0
-    recency_days = None
-    parsed_last = None
-    if last_rep:
-        parsed_last = _parse_dt(last_rep)
-    if parsed_last:
-        try:
-            now = datetime.now(timezone.utc)
-            parsed_last_utc = parsed_last if parsed_last.tzinfo else parsed_last.replace(tzinfo=timezone.utc)
-            recency_days = (now - parsed_last_utc).days
-        except Exception:
-            try:
-                recency_days = (datetime.now() - parsed_last).days
-            except Exception:
-                recency_days = None
-    if recency_days is not None:
-        if recency_days <= 7:
-            recency_contrib = 10
-        elif recency_days <= 30:
-            recency_contrib = 7
-        elif recency_days <= 90:
-            recency_contrib = 4
-        elif recency_days <= 365:
-            recency_contrib = 2
-    breakdown["last_reported_days"] = recency_days
-    breakdown["recency_contrib"] = recency_contrib
-    score += recency_contrib
-
-    # Country heuristic: small bump for high-risk countries
+            created_ts = parse_ts(creation)
+            if created_ts is not None:
+                has_age = True
+                age_days = _days_since(created_ts, now_ts)
+
+    # Recency of lastReportedAt (AbuseIPDB)
+    last_rep = (abuse or {}).get("lastReportedAt") or ench.get("abuse_lastReportedAt")
+    last_ts = parse_ts(last_rep)
+    recency_days = _days_since(last_ts, now_ts) if last_ts is not None else None
+
+    # Country
     country = None
     if isinstance(ench.get("geoip"), dict):
         country = ench["geoip"].get("country_iso") or ench["geoip"].get("country")
     country = (country or "").upper()
-    country_contrib = 3 if country in HIGH_RISK_COUNTRIES else 0
-    breakdown["country"] = country or None
-    breakdown["country_contrib"] = country_contrib
-    score += country_contrib
 
+    return (src, abuse_conf, total_reports, distinct, pdns_count, otx_count, ptr, ptr_flag,
+            isp, cloud_flag, whois_present, has_age, age_days, recency_days, country)
+
+# age_days / recency_days columns use this for "unknown" (no parseable date)
+NO_DAYS = np.iinfo(np.int32).min
+
+def _log_bucket(x, mult, cap):
+    """min(cap, round(log10(x + 1) * mult)) where x > 0, else 0 (round half to even, like round())."""
+    xf = x.astype(np.float64)
+    return np.where(x > 0, np.minimum(cap, np.rint(np.log10(np.maximum(xf, 0) + 1) * mult)), 0).astype(np.int64)
+
+def _score_core_np(abuse_conf, total_reports, distinct, pdns, otx, ptr_flag, cloud_flag,
+                   whois_present, age_days, recency_days, country_high, src_weight):
+    """
+    Numeric scoring core over int64 columns (age_days / recency_days use NO_DAYS for unknown).
+    Returns (abuse, reports, users, reports_per_user, rpu, pdns, otx, ptr, cloud_penalty,
+             whois, domain_age, recency, country, no_signals_penalty, raw, final) arrays.
+    """
+    abuse_c = np.minimum(24, np.rint(abuse_conf * 0.2)).astype(np.int64)
+    reports_c = _log_bucket(total_reports, 4.0, 18)
+    users_c = _log_bucket(distinct, 3.2, 12)
+    # reports per distinct user (density); high density more suspicious
+    rp = np.where(distinct > 0, total_reports / np.maximum(1, distinct), 0.0)
+    rp_c = _log_bucket(rp, 2.5, 8)
+    pdns_c = np.minimum(8, pdns)
+    otx_c = np.minimum(8, otx * 2)
+    ptr_c = ptr_flag * 10
+    cloud_pen = cloud_flag * 8
+    whois_c = whois_present * 6
+    age_c = np.where(age_days == NO_DAYS, 0, np.select([age_days <= 30, age_days <= 365], [8, 4], 0))
+    rec_c = np.where(recency_days == NO_DAYS, 0,
+                     np.select([recency_days <= 7, recency_days <= 30, recency_days <= 90, recency_days <= 365],
+                               [10, 7, 4, 2], 0))
+    country_c = country_high * 3
     # If no signals at all, small penalty
-    signals = 0
-    for k in ("abuse_confidence","total_reports","distinct_users","passive_dns_count","otx_count","ptr_contrib","whois_present"):
-        val = breakdown.get(k) or 0
-        if val:
-            signals += 1
-    if signals == 0:
-        penalty = 5
-        score -= penalty
-        breakdown["no_signals_penalty"] = -penalty
+    signals = ((abuse_conf != 0) | (total_reports != 0) | (distinct != 0) | (pdns != 0)
+               | (otx != 0) | (ptr_c != 0) | (whois_present != 0))
+    penalty = np.where(signals, 0, -5)
+    raw = (10 + src_weight + abuse_c + reports_c + users_c + rp_c + pdns_c + otx_c + ptr_c
+           - cloud_pen + whois_c + age_c + rec_c + country_c + penalty)
+    return (abuse_c, reports_c, users_c, rp, rp_c, pdns_c, otx_c, ptr_c, cloud_pen,
+            whois_c, age_c, rec_c, country_c, penalty, raw, np.clip(raw, 0, 100))
+
+def _score_row(a, r, u, pdns, otx, ptr_flag, cloud_flag, whois_present, age_days, recency_days,
+               country_high, src_weight):
+    """
+    One IOC's worth of _score_core_np on plain ints (same outputs, as scalars). Plain Python
+    for score_ioc(); compiled as the per-row body of the numba kernel.
+    """
+    abuse_c = min(24, round(a * 0.2))
+    reports_c = min(18, round(math.log10(r + 1.0) * 4.0)) if r > 0 else 0
+    users_c = min(12, round(math.log10(u + 1.0) * 3.2)) if u > 0 else 0
+    rp = r / max(1, u) if u > 0 else 0.0
+    rp_c = min(8, round(math.log10(rp + 1.0) * 2.5)) if rp > 0 else 0
+    pdns_c = min(8, pdns)
+    otx_c = min(8, otx * 2)
+    ptr_c = ptr_flag * 10
+    cloud_pen = cloud_flag * 8
+    whois_c = whois_present * 6
+    if age_days == NO_DAYS:
+        age_c = 0
+    elif age_days <= 30:
+        age_c = 8
+    elif age_days <= 365:
+        age_c = 4
+    else:
+        age_c = 0
+    d = recency_days
+    if d == NO_DAYS:
+        rec_c = 0
+    elif d <= 7:
+        rec_c = 10
+    elif d <= 30:
+        rec_c = 7
+    elif d <= 90:
+        rec_c = 4
+    elif d <= 365:
+        rec_c = 2
     else:
-        breakdown["no_signals_penalty"] = 0
+        rec_c = 0
+    country_c = country_high * 3
+    signals = a != 0 or r != 0 or u != 0 or pdns != 0 or otx != 0 or ptr_c != 0 or whois_present != 0
+    penalty = 0 if signals else -5
+    raw = (10 + src_weight + abuse_c + reports_c + users_c + rp_c + pdns_c + otx_c + ptr_c
+           - cloud_pen + whois_c + age_c + rec_c + country_c + penalty)
+    return (abuse_c, reports_c, users_c, rp, rp_c, pdns_c, otx_c, ptr_c, cloud_pen,
+            whois_c, age_c, rec_c, country_c, penalty, raw, max(0, min(100, raw)))
+
+if _NUMBA_AVAILABLE:
+    _score_row_nb = njit(cache=True)(_score_row)
+
+    # every IOC is independent and only writes its own slot, so prange can split the rows
+    # across threads; no fastmath, so log10/round (and thus scores) match the NumPy path exactly
+    @njit(cache=True, parallel=True)
+    def _score_core(abuse_conf, total_reports, distinct, pdns, otx, ptr_flag, cloud_flag,
+                    whois_present, age_days, recency_days, country_high, src_weight):
+        n = abuse_conf.shape[0]
+        abuse_c = np.empty(n, dtype=np.int64)
+        reports_c = np.empty(n, dtype=np.int64)
+        users_c = np.empty(n, dtype=np.int64)
+        rp = np.empty(n, dtype=np.float64)
+        rp_c = np.empty(n, dtype=np.int64)
+        pdns_c = np.empty(n, dtype=np.int64)
+        otx_c = np.empty(n, dtype=np.int64)
+        ptr_c = np.empty(n, dtype=np.int64)
+        cloud_pen = np.empty(n, dtype=np.int64)
+        whois_c = np.empty(n, dtype=np.int64)
+        age_c = np.empty(n, dtype=np.int64)
+        rec_c = np.empty(n, dtype=np.int64)
+        country_c = np.empty(n, dtype=np.int64)
+        penalty = np.empty(n, dtype=np.int64)
+        raw = np.empty(n, dtype=np.int64)
+        final = np.empty(n, dtype=np.int64)
+        for i in prange(n):
+            (abuse_c[i], reports_c[i], users_c[i], rp[i], rp_c[i], pdns_c[i], otx_c[i], ptr_c[i],
+             cloud_pen[i], whois_c[i], age_c[i], rec_c[i], country_c[i], penalty[i], raw[i],
+             final[i]) = _score_row_nb(abuse_conf[i], total_reports[i], distinct[i], pdns[i], otx[i],
+                                       ptr_flag[i], cloud_flag[i], whois_present[i], age_days[i],
+                                       recency_days[i], country_high[i], src_weight[i])
+        return (abuse_c, reports_c, users_c, rp, rp_c, pdns_c, otx_c, ptr_c, cloud_pen,
+                whois_c, age_c, rec_c, country_c, penalty, raw, final)
+else:
+    _score_core = _score_core_np
+
+_CORE_INPUTS = ("abuse_conf", "total_reports", "distinct", "pdns_count", "otx_count", "ptr_flag", "cloud_flag",
+                "whois_present", "age_days", "recency_days", "country_high", "src_weight")
+_CORE_OUTPUTS = ("abuse_contrib", "total_reports_contrib", "distinct_users_contrib", "reports_per_user",
+                 "reports_per_user_contrib", "passive_dns_contrib", "otx_contrib", "ptr_contrib", "cloud_penalty",
+                 "whois_contrib", "domain_age_contrib", "recency_contrib", "country_contrib",
+                 "no_signals_penalty", "final_score_raw", "final_score")
+
+def signal_columns(iocs, now=None):
+    """Raw scoring signals of a batch of IOCs as a dict of per-IOC columns (NumPy arrays
+    for everything the numeric core reads, lists for the breakdown-only fields).
+    `now` (aware datetime) is the reference for age/recency; default: one clock read per batch."""
+    now_ts = (now or datetime.now(timezone.utc)).timestamp()
+    rows = [_extract_signals(ioc, now_ts) for ioc in iocs]
+    n = len(rows)
+    (src, abuse_conf, total_reports, distinct, pdns_count, otx_count, ptr, ptr_flag,
+     isp, cloud_flag, whois_present, has_age, age_days, recency_days, country) = zip(*rows) if n else ([],) * 15
 
-    # Final clamp
-    final_score = int(max(0, min(100, round(score))))
-    breakdown["final_score_raw"] = score
-    breakdown["final_score"] = final_score
+    # source weight via a per-batch code table: each distinct source string is weighted once
+    src_codes = {}
+    src_idx = np.array([src_codes.setdefault(x, len(src_codes)) for x in src], dtype=np.intp)
+    src_table = np.array([_source_weight(x) for x in src_codes], dtype=np.int64)
 
-    # Attach a few convenience fields so callers can see the meaningful signals easily
-    breakdown["abuse_confidence_raw"] = abuse_conf
-    breakdown["total_reports_raw"] = total_reports
-    breakdown["distinct_users_raw"] = distinct
-    breakdown["isp_raw"] = isp or None
+    cols = {
+        "src_weight": src_table[src_idx],
+        "abuse_conf": np.array(abuse_conf, dtype=np.int64),
+        "total_reports": np.array(total_reports, dtype=np.int64),
+        "distinct": np.array(distinct, dtype=np.int64),
+        "pdns_count": np.array(pdns_count, dtype=np.int64),
+        "otx_count": np.array(otx_count, dtype=np.int64),
+        "ptr_flag": np.array(ptr_flag, dtype=np.int64),
+        "cloud_flag": np.array(cloud_flag, dtype=np.int64),
+        "whois_present": np.array(whois_present, dtype=np.int64),
+        "age_days": np.array([NO_DAYS if d is None else d for d in age_days], dtype=np.int64),
+        "recency_days": np.array([NO_DAYS if d is None else d for d in recency_days], dtype=np.int64),
+        "country_high": _in_sorted(_encode_iso2(country), _HIGH_RISK_U16).astype(np.int64),
+        # object columns, only needed for the breakdown
+        "ptr": list(ptr), "isp": list(isp), "country": list(country),
+        "has_age": list(has_age), "age_days_raw": list(age_days), "recency_days_raw": list(recency_days),
+    }
+    return cols
 
-    return final_score, breakdown
+def score_columns(iocs, now=None):
+    """Score a batch of IOCs (a list of dicts, or signal_columns() output);
+    returns a dict of per-IOC columns (raw signals and contributions)."""
+    cols = dict(iocs) if isinstance(iocs, dict) else signal_columns(iocs, now)
+    out = _score_core(*(cols[k] for k in _CORE_INPUTS))
+    cols.update(zip(_CORE_OUTPUTS, out))
+    cols["final_score"] = cols["final_score"].astype(np.int32)
+    return cols
+
+def breakdowns(cols):
+    """Materialise the per-IOC breakdown dicts (explainability contract) from score_columns()."""
+    c = {k: (v.tolist() if isinstance(v, np.ndarray) else v) for k, v in cols.items()}
+    out = []
+    for i in range(len(c["final_score"])):
+        b = {
+            "base": 10,
+            "source_weight": c["src_weight"][i],
+            "abuse_confidence": c["abuse_conf"][i],
+            "abuse_contrib": c["abuse_contrib"][i],
+            "total_reports": c["total_reports"][i],
+            "total_reports_contrib": c["total_reports_contrib"][i],
+            "distinct_users": c["distinct"][i],
+            "distinct_users_contrib": c["distinct_users_contrib"][i],
+            "reports_per_user": float(c["reports_per_user"][i]),
+            "reports_per_user_contrib": c["reports_per_user_contrib"][i],
+            "passive_dns_count": c["pdns_count"][i],
+            "passive_dns_contrib": c["passive_dns_contrib"][i],
+            "otx_count": c["otx_count"][i],
+            "otx_contrib": c["otx_contrib"][i],
+            "ptr": c["ptr"][i] or None,
+            "ptr_contrib": c["ptr_contrib"][i],
+            "isp": c["isp"][i] or None,
+            "cloud_flag": c["cloud_flag"][i],
+            "cloud_penalty": -c["cloud_penalty"][i],
+        }
+        if c["has_age"][i]:
+            b["domain_age_days"] = c["age_days_raw"][i]
+        b["whois_present"] = c["whois_present"][i]
+        b["whois_contrib"] = c["whois_contrib"][i]
+        b["domain_age_contrib"] = c["domain_age_contrib"][i]
+        b["last_reported_days"] = c["recency_days_raw"][i]
+        b["recency_contrib"] = c["recency_contrib"][i]
+        b["country"] = c["country"][i] or None
+        b["country_contrib"] = c["country_contrib"][i]
+        b["no_signals_penalty"] = c["no_signals_penalty"][i]
+        b["final_score_raw"] = c["final_score_raw"][i]
+        b["final_score"] = c["final_score"][i]
+        # Attach a few convenience fields so callers can see the meaningful signals easily
+        b["abuse_confidence_raw"] = c["abuse_conf"][i]
+        b["total_reports_raw"] = c["total_reports"][i]
+        b["distinct_users_raw"] = c["distinct"][i]
+        b["isp_raw"] = c["isp"][i] or None
+        out.append(b)
+    return out
+
+def score_iocs_batch(iocs, now=None):
+    """
+    Input: list of ioc dicts (same shape score_ioc expects), or their signal_columns();
+           optional `now` (aware datetime) shared by every IOC, e.g. across several batches
+    Returns: (scores: np.ndarray[int32], breakdowns: list[dict]) in input order
+    """
+    cols = score_columns(iocs, now)
+    return cols["final_score"], breakdowns(cols)
+
+def score_ioc(ioc, now=None):
+    """
+    Input: ioc dict (expected to have 'type','value','enrichment'); optional `now` as above
+    Returns: (final_score:int 0..100, breakdown:dict)
+    """
+    # scalar path: for one IOC, building columns and launching the batch kernel costs
+    # far more than the arithmetic itself
+    now_ts = (now or datetime.now(timezone.utc)).timestamp()
+    (src, abuse_conf, total_reports, distinct, pdns_count, otx_count, ptr, ptr_flag,
+     isp, cloud_flag, whois_present, has_age, age_days, recency_days, country) = _extract_signals(ioc, now_ts)
+    (abuse_c, reports_c, users_c, rp, rp_c, pdns_c, otx_c, ptr_c, cloud_pen, whois_c, age_c, rec_c,
+     country_c, penalty, raw, final) = _score_row(
+        abuse_conf, total_reports, distinct, pdns_count, otx_count, ptr_flag, cloud_flag, whois_present,
+        NO_DAYS if age_days is None else age_days, NO_DAYS if recency_days is None else recency_days,
+        int(country in HIGH_RISK_COUNTRIES), _source_weight(src))
+    # same keys, order and values as breakdowns()
+    b = {
+        "base": 10,
+        "source_weight": _source_weight(src),
+        "abuse_confidence": abuse_conf,
+        "abuse_contrib": abuse_c,
+        "total_reports": total_reports,
+        "total_reports_contrib": reports_c,
+        "distinct_users": distinct,
+        "distinct_users_contrib": users_c,
+        "reports_per_user": float(rp),
+        "reports_per_user_contrib": rp_c,
+        "passive_dns_count": pdns_count,
+        "passive_dns_contrib": pdns_c,
+        "otx_count": otx_count,
+        "otx_contrib": otx_c,
+        "ptr": ptr or None,
+        "ptr_contrib": ptr_c,
+        "isp": isp or None,
+        "cloud_flag": cloud_flag,
+        "cloud_penalty": -cloud_pen,
+    }
+    if has_age:
+        b["domain_age_days"] = age_days
+    b["whois_present"] = whois_present
+    b["whois_contrib"] = whois_c
+    b["domain_age_contrib"] = age_c
+    b["last_reported_days"] = recency_days
+    b["recency_contrib"] = rec_c
+    b["country"] = country or None
+    b["country_contrib"] = country_c
+    b["no_signals_penalty"] = penalty
+    b["final_score_raw"] = raw
+    b["final_score"] = final
+    b["abuse_confidence_raw"] = abuse_conf
+    b["total_reports_raw"] = total_reports
+    b["distinct_users_raw"] = distinct
+    b["isp_raw"] = isp or None
+    return final, b
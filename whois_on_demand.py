@@ -3,35 +3,83 @@
 WHOIS-on-demand helper.
 
 Runs WHOIS only for high-risk IOCs (or IOCs above a score threshold).
-Parallelized with threads; results are appended as JSON-lines to:
+Parallelized with threads (or, with --async, asyncio sockets talking WHOIS on port 43
+directly); results are appended as JSON-lines to:
   ./store/whois_high.jsonl
 
-Also merges WHOIS into ./store/enrich_cache.json when --merge is used.
+Domain IOCs are grouped by registrable domain (www.foo.com and api.foo.com -> one WHOIS
+for foo.com) and the answer is recorded for every IOC in the group.
+
+Lookups are cached one row per value in ./store/whois_cache.sqlite (see utils/kvstore.py);
+an existing ./store/whois_cache.json is imported on first run.
+
+With --merge, updated enrich cache entries are appended to ./store/enrich_cache.jsonl,
+the log run_enrich.py / run_whois_high.py / run_post_enrich.py replay and compact into
+enrich_cache.json.
 
 Usage:
     python whois_on_demand.py                  # default: risk_bucket == 'high', concurrency=10
     python whois_on_demand.py --threshold 70   # numeric threshold
     python whois_on_demand.py --max 50         # only process top 50 candidates
     python whois_on_demand.py --concurrency 20
-    python whois_on_demand.py --merge          # merge whois into enrich_cache.json
+    python whois_on_demand.py --async --concurrency 200   # asyncio port-43 client, no threads/forks
+    python whois_on_demand.py --merge          # merge whois into the enrich cache (via its log)
+    python whois_on_demand.py --compact        # keep only key parsed fields, drop the raw WHOIS text
 """
 
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 import argparse
-import json
+import asyncio
+import functools
 import os
+import re
+import selectors
 import subprocess
 import sys
 import time
 import shutil
 import traceback
 
+import numpy as np
+import orjson
+
+from utils.indexed_store import build_store, rows, top_by_score
+from utils.kvstore import KVStore
+
 STORE_INDEX = "./store/iocs_indexed.json"
 WHOIS_OUT = "./store/whois_high.jsonl"
-WHOIS_CACHE = "./store/whois_cache.json"
+WHOIS_OUT_IDX = WHOIS_OUT + ".idx"  # values already in WHOIS_OUT, one per line
+WHOIS_CACHE = "./store/whois_cache.json"  # legacy JSON cache, imported once into WHOIS_CACHE_DB
+WHOIS_CACHE_DB = "./store/whois_cache.sqlite"
 ENRICH_CACHE = "./store/enrich_cache.json"
+ENRICH_CACHE_LOG = "./store/enrich_cache.jsonl"
 BACKUP_SUFFIX = ".bak"
+WRITE_BATCH = 256  # WHOIS_OUT records buffered per write
+IANA_WHOIS = "whois.iana.org"
+MAX_REFERRALS = 3
+
+# referral lines from IANA ("refer:"/"whois:"), thin registries ("Registrar WHOIS Server:")
+# and RIRs ("ReferralServer: whois://...")
+_REFERRAL_RE = re.compile(
+    r"^\s*(?:refer|whois|registrar whois server|whois server|referralserver):\s*(?:r?whois://)?([a-z0-9.-]+)",
+    re.IGNORECASE | re.MULTILINE,
+)
+
+# optional: ijson streams large index files item by item
+try:
+    import ijson
+except Exception:
+    ijson = None
+
+STREAM_MIN_BYTES = 50 * 1024 * 1024  # stream STORE_INDEX with ijson above this size
+
+# optional: tldextract maps domains to their registrable domain (bundled suffix list, no fetch)
+try:
+    import tldextract
+    _EXTRACT = tldextract.TLDExtract(suffix_list_urls=())
+except Exception:
+    _EXTRACT = None
 
 # Try to import python-whois; if not present we'll fall back to system 'whois'
 try:
@@ -44,8 +92,8 @@ except Exception:
 def load_json(path, default):
     if os.path.exists(path):
         try:
-            with open(path, "r") as f:
-                return json.load(f)
+            with open(path, "rb") as f:
+                return orjson.loads(f.read())
         except Exception:
             print(f"[WARN] Failed to parse {path}, returning default.")
             return default
@@ -55,20 +103,129 @@ def load_json(path, default):
 def save_json(path, obj):
     os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
     tmp = path + ".tmp"
-    with open(tmp, "w") as f:
-        json.dump(obj, f, indent=2)
+    with open(tmp, "wb") as f:
+        f.write(orjson.dumps(obj, option=orjson.OPT_INDENT_2))
     # atomic-ish move
     if os.path.exists(path):
         shutil.copy2(path, path + BACKUP_SUFFIX)
     os.replace(tmp, path)
 
 
+def open_whois_cache():
+    """Open the WHOIS KVStore, importing the legacy whois_cache.json the first time."""
+    fresh = not os.path.exists(WHOIS_CACHE_DB)
+    store = KVStore(WHOIS_CACHE_DB)
+    if fresh and os.path.exists(WHOIS_CACHE):
+        legacy = load_json(WHOIS_CACHE, {})
+        store.put_many(legacy)
+        print(f"[INFO] Imported {len(legacy)} entries from {WHOIS_CACHE} -> {WHOIS_CACHE_DB}")
+    return store
+
+
+def _idx_header():
+    """Fixed-width first line of the .idx sidecar: WHOIS_OUT's inode and size it covers."""
+    st = os.stat(WHOIS_OUT)
+    return f"{st.st_ino:20d} {st.st_size:20d}\n".encode()
+
+
+IDX_HEADER_LEN = 42  # len(_idx_header())
+
+
+def load_seen():
+    """
+    Values already written to WHOIS_OUT, read from its .idx sidecar. The sidecar is
+    trusted only if its header still matches WHOIS_OUT's inode and size (append_seen
+    updates it right after every WHOIS_OUT write); otherwise it is rebuilt from
+    WHOIS_OUT once. Without WHOIS_OUT the sidecar is stale and is removed.
+    """
+    if not os.path.exists(WHOIS_OUT):
+        if os.path.exists(WHOIS_OUT_IDX):
+            os.remove(WHOIS_OUT_IDX)
+        return set()
+    if os.path.exists(WHOIS_OUT_IDX):
+        with open(WHOIS_OUT_IDX, "rb") as f:
+            if f.read(IDX_HEADER_LEN) == _idx_header():
+                return set(f.read().decode("utf-8").splitlines())
+    seen = set()
+    try:
+        with open(WHOIS_OUT, "rb") as f:
+            for line in f:
+                try:
+                    obj = orjson.loads(line)
+                    seen.add(obj.get("value"))
+                except Exception:
+                    continue
+    except Exception:
+        return seen
+    tmp = WHOIS_OUT_IDX + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(_idx_header())
+        f.write("".join(f"{v}\n" for v in seen if v is not None).encode("utf-8"))
+    os.replace(tmp, WHOIS_OUT_IDX)
+    return seen
+
+
+def append_seen(values):
+    """Record values just appended to WHOIS_OUT in its .idx sidecar, then stamp its header."""
+    data = "".join(f"{v}\n" for v in values if v is not None).encode("utf-8")
+    with open(WHOIS_OUT_IDX, "r+b" if os.path.exists(WHOIS_OUT_IDX) else "w+b") as f:
+        f.seek(0, os.SEEK_END)
+        if f.tell() < IDX_HEADER_LEN:
+            f.seek(0)
+            f.truncate()
+            f.write(b" " * (IDX_HEADER_LEN - 1) + b"\n")  # placeholder, never matches
+        f.write(data)
+        # header last: a crash before this leaves it stale, and load_seen rebuilds
+        f.seek(0)
+        f.write(_idx_header())
+
+
+def load_enrich_cache(keys=None):
+    """
+    enrich_cache.json plus any entries appended to its log since the last compaction.
+    With `keys`, only those entries are kept: large snapshots are streamed with ijson
+    so the untouched entries are never held in memory together.
+    """
+    if keys is None:
+        cache = load_json(ENRICH_CACHE, {})
+    else:
+        keys = set(keys)
+        if ijson is not None and os.path.exists(ENRICH_CACHE) and os.path.getsize(ENRICH_CACHE) >= STREAM_MIN_BYTES:
+            try:
+                with open(ENRICH_CACHE, "rb") as f:
+                    cache = {k: v for k, v in ijson.kvitems(f, "", use_float=True) if k in keys}
+            except Exception:
+                print(f"[WARN] Failed to parse {ENRICH_CACHE}, returning default.")
+                cache = {}
+        else:
+            cache = {k: v for k, v in load_json(ENRICH_CACHE, {}).items() if k in keys}
+    if os.path.exists(ENRICH_CACHE_LOG):
+        with open(ENRICH_CACHE_LOG, "rb") as f:
+            for line in f:
+                try:
+                    e = orjson.loads(line)
+                except Exception:
+                    continue  # torn last line after a crash
+                key = make_ioc_key(e)
+                if keys is None or key in keys:
+                    cache[key] = e
+    return cache
+
+
+@functools.cache
+def whois_binary():
+    """Absolute path of the system 'whois' binary (PATH is searched once per process)."""
+    return shutil.which("whois")
+
+
 def run_system_whois(value, timeout=30):
-    """Run system 'whois' command and return stdout (or error)."""
-    if shutil.which("whois") is None:
+    """Run system 'whois' command and return stdout (or error).
+    The CLI answers one query per process, so each lookup is a spawn; use --async to avoid it."""
+    exe = whois_binary()
+    if exe is None:
         return {"error": "whois_cli_missing", "raw": ""}
     try:
-        proc = subprocess.run(["whois", value], capture_output=True, text=True, timeout=timeout)
+        proc = subprocess.run([exe, value], capture_output=True, text=True, timeout=timeout)
         return {"raw": proc.stdout or "", "rc": proc.returncode}
     except subprocess.TimeoutExpired:
         return {"error": "timeout", "raw": ""}
@@ -101,6 +258,39 @@ def run_pywhois(value):
         return {"error": "pywhois_error", "error_msg": str(e), "raw": ""}
 
 
+async def whois43(server, value, timeout=30):
+    """Send one WHOIS query to server:43 and return the raw response bytes."""
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(server, 43), timeout)
+    try:
+        writer.write(value.encode("utf-8") + b"\r\n")
+        await writer.drain()
+        return await asyncio.wait_for(reader.read(), timeout)
+    finally:
+        writer.close()
+
+
+async def async_whois_lookup(value, timeout=30):
+    """WHOIS over asyncio: ask IANA, then follow referrals to the most specific server."""
+    server, raw, seen = IANA_WHOIS, "", set()
+    try:
+        for _ in range(MAX_REFERRALS + 1):
+            seen.add(server)
+            text = (await whois43(server, value, timeout)).decode("utf-8", errors="replace")
+            if text.strip():
+                raw = text
+            m = _REFERRAL_RE.search(text)
+            if not m or m.group(1).lower() in seen:
+                break
+            server = m.group(1).lower()
+    except asyncio.TimeoutError:
+        if not raw:
+            return {"error": "timeout", "raw": ""}
+    except Exception as e:
+        if not raw:
+            return {"error": str(e), "raw": ""}
+    return {"raw": raw}
+
+
 def whois_lookup(value, timeout=30):
     """Unified WHOIS lookup: try python-whois, fallback to system whois."""
     if HAVE_PYWHOIS:
@@ -118,26 +308,45 @@ def make_ioc_key(ioc):
     return f"{t}::{v}"
 
 
-def prepare_candidates(index_list, threshold=None, only_high=True):
-    cands = []
-    for it in index_list:
-        try:
-            score = it.get("score") or 0
-            bucket = it.get("risk_bucket", "").lower()
-            if threshold is not None:
-                if score >= threshold:
-                    cands.append(it)
-            else:
-                if only_high:
-                    if bucket == "high":
-                        cands.append(it)
-        except Exception:
-            continue
-    return cands
+def iter_index(path=STORE_INDEX):
+    """Yield indexed IOCs; large files are streamed with ijson when it is installed."""
+    if ijson is not None and os.path.getsize(path) >= STREAM_MIN_BYTES:
+        with open(path, "rb") as f:
+            yield from ijson.items(f, "item", use_float=True)
+        return
+    yield from load_json(path, [])
+
+
+def prepare_candidates(store, threshold=None, only_high=True):
+    """Boolean mask of WHOIS candidates over an indexed store (utils.indexed_store)."""
+    if threshold is not None:
+        return store["score"] >= threshold
+    if only_high:
+        return store["risk_bucket"] == "high"
+    return np.zeros(len(store["score"]), dtype=bool)
+
+
+def whois_target(ioc):
+    """What to ask WHOIS for: the registrable domain of a domain IOC, otherwise the value itself."""
+    v = ioc.get("value") or ""
+    if _EXTRACT is not None and ioc.get("type") == "domain":
+        reg = _EXTRACT(v).top_domain_under_public_suffix
+        if reg:
+            return reg.lower()
+    return v
+
+
+def group_by_whois_target(iocs):
+    """{whois target: [iocs]} keeping the incoming (score) order of first appearance."""
+    groups = {}
+    for it in iocs:
+        groups.setdefault(whois_target(it), []).append(it)
+    return groups
 
 
 def merge_whois_into_enrich_cache(enrich_cache, ioc, whois_data):
-    """Merge into enrich_cache entry for this IOC. Keep existing fields; add/overwrite whois."""
+    """Merge into enrich_cache entry for this IOC. Keep existing fields; add/overwrite whois.
+    Returns the merged entry (the caller appends it to the enrich cache log)."""
     key = make_ioc_key(ioc)
     entry = enrich_cache.get(key, {})
     # ensure standard structure
@@ -152,23 +361,53 @@ def merge_whois_into_enrich_cache(enrich_cache, ioc, whois_data):
     # update timestamps
     entry["_whois_last_seen"] = datetime.utcnow().isoformat() + "Z"
     enrich_cache[key] = entry
-    return enrich_cache
-
-
-def worker_whois(ioc, timeout):
-    """Worker that runs WHOIS and returns a record for output and cache."""
-    v = ioc.get("value")
-    t = ioc.get("type")
+    return entry
+
+
+# fields kept by --compact, and the raw-text lines they are recovered from when the
+# lookup only produced text (whois CLI / --async)
+COMPACT_FIELDS = ("registrar", "creation_date", "expiration_date", "name", "org")
+_RAW_FIELD_RES = {
+    "registrar": re.compile(r"^\s*(?:registrar|registrar name|sponsoring registrar):\s*(\S.*)$", re.I | re.M),
+    "creation_date": re.compile(r"^\s*(?:creation date|created on|created|registered on|registration time|domain registration date):\s*(\S.*)$", re.I | re.M),
+    "expiration_date": re.compile(r"^\s*(?:registry expiry date|registrar registration expiration date|expiration date|expiry date|expires on|paid-till):\s*(\S.*)$", re.I | re.M),
+    "name": re.compile(r"^\s*(?:registrant name|registrant):\s*(\S.*)$", re.I | re.M),
+    "org": re.compile(r"^\s*(?:registrant organization|org-name|orgname|organisation|organization):\s*(\S.*)$", re.I | re.M),
+}
+
+
+def compact_whois(whois_struct):
+    """Shrink a normalized WHOIS struct to COMPACT_FIELDS under "parsed" (raw text dropped);
+    fields missing from "parsed" are taken from the first matching raw-text line."""
+    if not isinstance(whois_struct, dict):
+        return whois_struct
+    parsed = whois_struct.get("parsed") if isinstance(whois_struct.get("parsed"), dict) else {}
+    raw = whois_struct.get("raw") or ""
+    out = {}
+    for k in COMPACT_FIELDS:
+        v = parsed.get(k)
+        if not v and raw:
+            m = _RAW_FIELD_RES[k].search(raw)
+            v = m.group(1).strip() if m else None
+        if v:
+            out[k] = v
+    compact = {"parsed": out}
+    if whois_struct.get("error"):
+        compact["error"] = whois_struct["error"]
+    return compact
+
+
+def make_whois_record(ioc, res):
+    """Build the output/cache record for one lookup result (as returned by whois_lookup)."""
     record = {
-        "value": v,
-        "type": t,
+        "value": ioc.get("value"),
+        "type": ioc.get("type"),
         "source": ioc.get("source"),
         "timestamp": datetime.utcnow().isoformat() + "Z",
         "cached": False,
         "whois": None,
     }
     try:
-        res = whois_lookup(v, timeout=timeout)
         # normalize response: prefer parsed dict if available, else raw text
         whois_struct = {}
         if isinstance(res, dict):
@@ -189,52 +428,124 @@ def worker_whois(ioc, timeout):
     return record
 
 
+def worker_whois(ioc, timeout):
+    """Worker that runs WHOIS and returns a record for output and cache."""
+    try:
+        return make_whois_record(ioc, whois_lookup(ioc.get("value"), timeout=timeout))
+    except Exception as e:
+        record = make_whois_record(ioc, None)
+        record["whois"] = {"error": "exception", "msg": str(e), "trace": traceback.format_exc()}
+        return record
+
+
+def run_cli_lookups(lookups, concurrency, timeout, on_result):
+    """Run the whois CLI for every IOC with up to `concurrency` children at once.
+    One thread multiplexes the children's stdout pipes on a selector (epoll on Linux)
+    instead of parking a thread in subprocess.run per lookup; on_result(ioc, record)
+    is called as each child exits or times out."""
+    exe = whois_binary()
+    if exe is None:
+        for ioc in lookups:
+            on_result(ioc, make_whois_record(ioc, {"error": "whois_cli_missing", "raw": ""}))
+        return
+    pending = iter(lookups)
+    sel = selectors.DefaultSelector()
+
+    def spawn():
+        ioc = next(pending, None)
+        if ioc is None:
+            return False
+        try:
+            proc = subprocess.Popen([exe, ioc.get("value")], stdin=subprocess.DEVNULL,
+                                    stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        except Exception as e:
+            on_result(ioc, make_whois_record(ioc, {"error": str(e), "raw": ""}))
+            return True
+        os.set_blocking(proc.stdout.fileno(), False)
+        sel.register(proc.stdout, selectors.EVENT_READ, (ioc, proc, [], time.monotonic() + timeout))
+        return True
+
+    def finish(key, res):
+        sel.unregister(key.fileobj)
+        key.fileobj.close()
+        on_result(key.data[0], make_whois_record(key.data[0], res))
+
+    while len(sel.get_map()) < concurrency and spawn():
+        pass
+    while sel.get_map():
+        wait = min(k.data[3] for k in sel.get_map().values()) - time.monotonic()
+        for key, _ in sel.select(max(wait, 0)):
+            _, proc, chunks, _ = key.data
+            try:
+                data = os.read(key.fd, 65536)
+            except BlockingIOError:
+                continue
+            if data:
+                chunks.append(data)
+                continue
+            # EOF: the child is done writing
+            finish(key, {"raw": b"".join(chunks).decode("utf-8", errors="replace"), "rc": proc.wait()})
+        now = time.monotonic()
+        for key in [k for k in sel.get_map().values() if k.data[3] <= now]:
+            key.data[1].kill()
+            key.data[1].wait()
+            finish(key, {"error": "timeout", "raw": ""})
+        while len(sel.get_map()) < concurrency and spawn():
+            pass
+    sel.close()
+
+
+async def run_async_lookups(to_run, concurrency, timeout, on_result):
+    """Run async_whois_lookup for every IOC, at most `concurrency` sockets in flight;
+    on_result(ioc, record) is called as each lookup completes."""
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(ioc):
+        async with sem:
+            return ioc, make_whois_record(ioc, await async_whois_lookup(ioc.get("value"), timeout))
+
+    for fut in asyncio.as_completed([one(it) for it in to_run]):
+        on_result(*await fut)
+
+
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--threshold", type=int, default=None, help="Minimum numeric score to WHOIS")
     parser.add_argument("--only-high", action="store_true", default=True, help="Only process risk_bucket=='high' (default)")
     parser.add_argument("--max", type=int, default=None, help="Limit number processed this run")
-    parser.add_argument("--concurrency", type=int, default=10, help="Thread concurrency")
+    parser.add_argument("--concurrency", type=int, default=10, help="Thread concurrency (in-flight sockets with --async)")
+    parser.add_argument("--async", dest="use_async", action="store_true",
+                        help="Query WHOIS servers directly over asyncio (port 43) instead of threads + python-whois/whois CLI")
     parser.add_argument("--timeout", type=int, default=30, help="WHOIS command timeout (seconds)")
     parser.add_argument("--only-domains", action="store_true", help="Only WHOIS domain IOCs (skip IPs)")
     parser.add_argument("--merge", action="store_true", help="Merge WHOIS into enrich_cache.json (safe write)")
+    parser.add_argument("--compact", action="store_true",
+                        help="Store only registrar/creation/expiration/name/org (no raw WHOIS text) in outputs and caches")
     args = parser.parse_args()
 
     # Load the indexed IOCs
     if not os.path.exists(STORE_INDEX):
         print(f"[ERROR] {STORE_INDEX} not found - run indexer first.")
         sys.exit(1)
-    indexed = load_json(STORE_INDEX, [])
-
-    candidates = prepare_candidates(indexed, threshold=args.threshold, only_high=args.only_high)
+    # columns only (type/value/source/score/risk_bucket): the enrichment payloads are not kept
+    store = build_store(iter_index(STORE_INDEX))
+    mask = prepare_candidates(store, threshold=args.threshold, only_high=args.only_high)
     if args.only_domains:
-        candidates = [c for c in candidates if c.get("type") == "domain"]
+        mask &= store["type"] == "domain"
 
-    # sort by score desc so we WHOIS most critical first
-    candidates.sort(key=lambda x: x.get("score", 0), reverse=True)
-
-    if args.max:
-        candidates = candidates[: args.max]
+    # score desc so we WHOIS most critical first (ties keep index order); with --max only
+    # the top N are partitioned out and sorted
+    candidates = rows(store, top_by_score(store, mask, args.max or None))
 
     print(f"[INFO] Candidates to WHOIS: {len(candidates)} (concurrency={args.concurrency})")
 
-    # Load caches
-    whois_cache = load_json(WHOIS_CACHE, {})
-    enrich_cache = load_json(ENRICH_CACHE, {})
+    # Open caches: WHOIS rows are read on demand; the enrich cache is only needed for --merge,
+    # and then only the candidates' entries (the only ones read or merged into)
+    whois_cache = open_whois_cache()
+    enrich_cache = load_enrich_cache(keys=map(make_ioc_key, candidates)) if args.merge else {}
 
     # Prepare seen set from existing WHOIS_OUT to avoid double output
-    seen = set()
-    if os.path.exists(WHOIS_OUT):
-        try:
-            with open(WHOIS_OUT, "r") as f:
-                for line in f:
-                    try:
-                        obj = json.loads(line)
-                        seen.add(obj.get("value"))
-                    except Exception:
-                        continue
-        except Exception:
-            pass
+    seen = load_seen()
 
     # Filter out already-cached items (but if cached we still append to WHOIS_OUT for audit)
     to_run = []
@@ -244,67 +555,111 @@ def main():
         if v in seen:
             continue
         key = make_ioc_key(it)
-        if v in whois_cache or (key in enrich_cache and "whois" in enrich_cache[key].get("enrichment", {})):
+        cached = whois_cache.get(v)
+        if cached is None and key in enrich_cache:
+            cached = enrich_cache[key].get("enrichment", {}).get("whois")
+        if cached is not None:
             # append cached record to WHOIS_OUT later
-            append_from_cache.append((it, whois_cache.get(v) or enrich_cache.get(key).get("enrichment", {}).get("whois")))
+            append_from_cache.append((it, cached))
             continue
         to_run.append(it)
 
-    print(f"[INFO] To query (not cached/already-output): {len(to_run)} ; Cached-to-append: {len(append_from_cache)}")
+    # one lookup per registrable domain; the first (highest-scored) IOC of a group stands in for it
+    groups = group_by_whois_target(to_run)
+    lookups = [dict(members[0], value=target) for target, members in groups.items()]
+
+    print(f"[INFO] To query (not cached/already-output): {len(to_run)} in {len(lookups)} lookups ; Cached-to-append: {len(append_from_cache)}")
 
     # Append cached items first (so WHOIS_OUT contains a full picture)
     if append_from_cache:
         os.makedirs(os.path.dirname(WHOIS_OUT) or ".", exist_ok=True)
-        with open(WHOIS_OUT, "a") as f:
-            for it, cached in append_from_cache:
-                rec = {
-                    "value": it.get("value"),
-                    "type": it.get("type"),
-                    "timestamp": datetime.utcnow().isoformat() + "Z",
-                    "cached": True,
-                    "whois": cached,
-                }
-                f.write(json.dumps(rec) + "\n")
-
-    # Run lookups concurrently
+        ts = datetime.utcnow().isoformat() + "Z"
+        with open(WHOIS_OUT, "ab") as f:
+            f.write(b"".join(
+                orjson.dumps({"value": it.get("value"), "type": it.get("type"), "timestamp": ts,
+                              "cached": True, "whois": cached}) + b"\n"
+                for it, cached in append_from_cache
+            ))
+        append_seen(it.get("value") for it, _ in append_from_cache)
+
+    # Run lookups concurrently; cache rows are written in one transaction afterwards
     completed = 0
-    if to_run:
-        with ThreadPoolExecutor(max_workers=args.concurrency) as ex:
-            futures = {ex.submit(worker_whois, it, args.timeout): it for it in to_run}
-            os.makedirs(os.path.dirname(WHOIS_OUT) or ".", exist_ok=True)
-            with open(WHOIS_OUT, "a") as f_out:
-                for fut in as_completed(futures):
-                    it = futures[fut]
-                    try:
-                        res = fut.result()
-                    except Exception as e:
-                        res = {"value": it.get("value"), "type": it.get("type"), "timestamp": datetime.utcnow().isoformat() + "Z", "whois": {"error": str(e)}}
-                    # Append to JSONL
-                    f_out.write(json.dumps(res) + "\n")
-                    # Update caches in memory
-                    value_key = res["value"]
-                    whois_cache[value_key] = res.get("whois") or {}
-                    # Also merge into enrich_cache entry
-                    try:
-                        merge_whois_into_enrich_cache(enrich_cache, it, res.get("whois") or {})
-                    except Exception:
-                        pass
-
-                    completed += 1
-                    if completed % 10 == 0 or completed == len(to_run):
-                        print(f"[INFO] Completed {completed}/{len(to_run)}")
-
-    # Save caches
+    new_whois = {}
+    merged = []
+    if lookups:
+        os.makedirs(os.path.dirname(WHOIS_OUT) or ".", exist_ok=True)
+        with open(WHOIS_OUT, "ab") as f_out:
+            pending = []  # serialized records not yet written
+            pending_values = []
+
+            def flush():
+                f_out.write(b"".join(pending))
+                f_out.flush()  # WHOIS_OUT before its sidecar, so the sidecar is never ahead
+                append_seen(pending_values)
+                pending.clear()
+                pending_values.clear()
+
+            def handle_result(lookup, res):
+                nonlocal completed
+                if args.compact:
+                    res = dict(res, whois=compact_whois(res.get("whois")))
+                whois_data = res.get("whois") or {}
+                # fan the shared answer out to every IOC of the group
+                for it in groups[lookup["value"]]:
+                    rec = dict(res, value=it.get("value"), type=it.get("type"), source=it.get("source"))
+                    # Append to JSONL (buffered)
+                    pending.append(orjson.dumps(rec) + b"\n")
+                    pending_values.append(rec["value"])
+                    new_whois[rec["value"]] = whois_data
+                    if args.merge:
+                        try:
+                            merged.append(merge_whois_into_enrich_cache(enrich_cache, it, whois_data))
+                        except Exception:
+                            pass
+
+                if len(pending) >= WRITE_BATCH:
+                    flush()
+
+                completed += 1
+                if completed % 10 == 0 or completed == len(lookups):
+                    print(f"[INFO] Completed {completed}/{len(lookups)}")
+
+            try:
+                if args.use_async:
+                    asyncio.run(run_async_lookups(lookups, args.concurrency, args.timeout, handle_result))
+                elif not HAVE_PYWHOIS:
+                    # CLI only: multiplex the whois children from this thread
+                    run_cli_lookups(lookups, args.concurrency, args.timeout, handle_result)
+                else:
+                    with ThreadPoolExecutor(max_workers=args.concurrency) as ex:
+                        futures = {ex.submit(worker_whois, it, args.timeout): it for it in lookups}
+                        for fut in as_completed(futures):
+                            it = futures[fut]
+                            try:
+                                res = fut.result()
+                            except Exception as e:
+                                res = {"value": it.get("value"), "type": it.get("type"), "timestamp": datetime.utcnow().isoformat() + "Z", "whois": {"error": str(e)}}
+                            handle_result(it, res)
+            finally:
+                # whatever completed before an error/interrupt still reaches WHOIS_OUT
+                flush()
+
+    # Save caches: only the rows touched this run
     try:
-        save_json(WHOIS_CACHE, whois_cache)
-        print(f"[INFO] WHOIS cache -> {WHOIS_CACHE}")
+        whois_cache.put_many(new_whois)
+        print(f"[INFO] WHOIS cache +{len(new_whois)} -> {WHOIS_CACHE_DB}")
     except Exception as e:
         print(f"[WARN] Failed saving WHOIS cache: {e}")
+    finally:
+        whois_cache.close()
 
-    if args.merge:
+    if args.merge and merged:
         try:
-            save_json(ENRICH_CACHE, enrich_cache)
-            print(f"[INFO] Merged WHOIS into enrich cache -> {ENRICH_CACHE}")
+            os.makedirs(os.path.dirname(ENRICH_CACHE_LOG) or ".", exist_ok=True)
+            with open(ENRICH_CACHE_LOG, "ab") as f:
+                for entry in merged:
+                    f.write(orjson.dumps(entry) + b"\n")
+            print(f"[INFO] Merged WHOIS into enrich cache log -> {ENRICH_CACHE_LOG} ({len(merged)} entries)")
         except Exception as e:
             print(f"[WARN] Failed to save enrich cache: {e}")
 